@@ -0,0 +1,193 @@
+"""解碼後音訊的共用儲存區：每個檔案只解碼一次（16 kHz 單聲道 float32），以 memmap 提供零複製的讀取
+
+多個行程或執行緒讀取同一個檔案時共用作業系統的分頁快取，記憶體用量不隨 worker 數增加；
+重新執行時只要原始檔未變更就不必再解碼。超過容量時依最近使用時間淘汰 (LRU)。
+
+用法:
+    python audio_store.py              # 顯示統計
+    python audio_store.py --clear      # 清空
+"""
+import os
+import time
+import hashlib
+import argparse
+
+from chunking import SAMPLE_RATE
+
+DEFAULT_STORE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "audio")
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024 * 1024
+# numpy 在第一次讀寫時才匯入，只建立儲存區不會拖慢啟動
+SAMPLE_DTYPE = "float32"
+SAMPLE_BYTES = 4
+SUFFIX = ".f32"
+
+# 其他行程正在解碼同一個檔案時的等待設定
+LOCK_POLL_SECONDS = 0.2
+STALE_LOCK_SECONDS = 30 * 60
+# 對應前檔案被其他行程淘汰時重新解碼的次數上限
+LOAD_ATTEMPTS = 3
+
+
+def _signature(path):
+    """路徑 + 大小 + 修改時間：原始檔變更後自動視為不同的音訊"""
+    stat = os.stat(path)
+    payload = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{SAMPLE_RATE}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class AudioStore:
+    """磁碟上的解碼音訊，讀取時以唯讀 memmap 對應"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, max_bytes=DEFAULT_MAX_BYTES, decode=None):
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self._decode = decode
+        self.hits = 0
+        self.decodes = 0
+        self.evictions = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+    def decode(self, path):
+        if self._decode is not None:
+            return self._decode(path)
+        from faster_whisper import decode_audio
+        return decode_audio(path, sampling_rate=SAMPLE_RATE)
+
+    def _path(self, key):
+        return os.path.join(self.store_dir, f"{key}{SUFFIX}")
+
+    def load(self, path):
+        """回傳整個檔案的唯讀 memmap（必要時先解碼並保存）"""
+        import numpy as np
+        stored = self._path(_signature(path))
+        for _ in range(LOAD_ATTEMPTS):
+            if not os.path.exists(stored):
+                self._materialize(path, stored)
+            else:
+                self.hits += 1
+                try:
+                    os.utime(stored)  # 更新存取時間作為 LRU 依據
+                except OSError:
+                    pass
+            try:
+                if os.path.getsize(stored) == 0:
+                    return np.zeros(0, dtype=SAMPLE_DTYPE)  # np.memmap 無法對應空檔案
+                return np.memmap(stored, dtype=SAMPLE_DTYPE, mode="r")
+            except OSError:
+                # 其他行程的 evict() 在檢查與對應之間刪除了檔案：重新解碼
+                continue
+        # 容量太小，剛寫入就一再被其他行程淘汰：不經儲存區直接解碼
+        self.decodes += 1
+        return np.ascontiguousarray(self.decode(path), dtype=SAMPLE_DTYPE)
+
+    def _materialize(self, path, stored):
+        """解碼並以原子操作寫入；其他行程正在解碼同一個檔案時等待其完成"""
+        lock_path = f"{stored}.lock"
+        while True:
+            try:
+                fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(fd)
+                break
+            except FileExistsError:
+                if os.path.exists(stored):
+                    self.hits += 1
+                    return
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > STALE_LOCK_SECONDS:
+                        os.remove(lock_path)  # 持有鎖的行程已中止
+                except OSError:
+                    pass
+                time.sleep(LOCK_POLL_SECONDS)
+
+        try:
+            if os.path.exists(stored):
+                self.hits += 1
+                return
+            import numpy as np
+            audio = np.ascontiguousarray(self.decode(path), dtype=SAMPLE_DTYPE)
+            tmp_path = f"{stored}.{os.getpid()}.tmp"
+            audio.tofile(tmp_path)
+            os.replace(tmp_path, stored)
+            self.decodes += 1
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+        self.evict(keep=stored)
+
+    def _entries(self):
+        """回傳 [(存取時間, 大小, 路徑)]"""
+        entries = []
+        for name in os.listdir(self.store_dir):
+            if not name.endswith(SUFFIX):
+                continue
+            path = os.path.join(self.store_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self, keep=None):
+        """總大小超過上限時，從最久未使用的項目開始刪除（已對應的 memmap 在 POSIX 上仍可繼續讀取）"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        return {
+            "entries": len(entries),
+            "bytes": total,
+            "audio_seconds": total / SAMPLE_BYTES / SAMPLE_RATE,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "decodes": self.decodes,
+            "evictions": self.evictions,
+        }
+
+    def stats_report(self):
+        stats = self.stats()
+        return (f"音訊儲存區: 重用 {stats['hits']} 次 / 解碼 {stats['decodes']} 次 | "
+                f"{stats['entries']} 個檔案，{stats['bytes'] / 1024 / 1024:.1f} MB "
+                f"({stats['audio_seconds'] / 3600:.1f} 小時音訊)")
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="解碼音訊儲存區管理")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR, help="儲存區資料夾")
+    parser.add_argument("--clear", action="store_true", help="清空儲存區")
+    args = parser.parse_args()
+
+    store = AudioStore(args.store_dir)
+    if args.clear:
+        store.clear()
+        print("✓ 已清空音訊儲存區")
+    else:
+        stats = store.stats()
+        print(f"資料夾: {args.store_dir}")
+        print(f"檔案數: {stats['entries']}")
+        print(f"大小: {stats['bytes'] / 1024 / 1024:.1f} MB / {stats['max_bytes'] / 1024 / 1024:.0f} MB")
+        print(f"音訊長度: {stats['audio_seconds'] / 3600:.2f} 小時")
@@ -0,0 +1,256 @@
+"""硬體自動調校：偵測 CPU / 記憶體 / 指令集，實測各組 compute_type 與執行緒設定，保存最快的一組
+
+用法:
+    python autotune.py --model medium            # 調校並保存
+    python autotune.py --model medium --show     # 顯示已保存的結果
+調校結果以「機器 + 模型」為鍵保存，之後 get_device_config 會直接採用。
+"""
+import os
+import json
+import time
+import math
+import platform
+import argparse
+
+CONFIG_PATH = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "autotune.json")
+
+SAMPLE_RATE = 16000
+BENCHMARK_SECONDS = 30
+
+CPU_COMPUTE_TYPES = ("int8", "int8_float32", "float32")
+CUDA_COMPUTE_TYPES = ("float16", "int8_float16")
+
+# 與實際轉錄相同的解碼設定，量測結果才有代表性
+BENCHMARK_OPTIONS = {"beam_size": 5, "language": "zh"}
+
+# 模型參數量（約略），用來排除記憶體放不下的組合
+MODEL_PARAMETERS = {
+    "tiny": 39e6,
+    "base": 74e6,
+    "small": 244e6,
+    "medium": 769e6,
+    "large-v2": 1550e6,
+    "large-v3": 1550e6,
+}
+BYTES_PER_WEIGHT = {
+    "int8": 1, "int8_float32": 1, "int8_float16": 1, "int8_bfloat16": 1,
+    "int16": 2, "float16": 2, "bfloat16": 2, "float32": 4,
+}
+
+
+def _read_cpu_flags():
+    """Linux 讀 /proc/cpuinfo；其他系統回傳空集合"""
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def total_memory():
+    """實體記憶體 (bytes)；無法取得時回傳 None"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        return None
+
+
+def available_memory():
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES")
+    except (ValueError, OSError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        return None
+
+
+def detect_hardware():
+    """偵測核心數、記憶體與相關指令集"""
+    import ctranslate2
+
+    flags = _read_cpu_flags()
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    return {
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "cpu_model": _cpu_model(),
+        "cores": cores,
+        "memory_total": total_memory(),
+        "memory_available": available_memory(),
+        "instructions": sorted(f for f in flags if f.startswith(("avx", "fma", "sse4", "asimd", "neon"))),
+        "cpu_compute_types": sorted(ctranslate2.get_supported_compute_types("cpu")),
+        "cuda_devices": ctranslate2.get_cuda_device_count(),
+    }
+
+
+def machine_key(hardware):
+    """同一台機器（或同型號主機）共用的鍵"""
+    return f"{platform.node()}|{hardware['cpu_model']}|{hardware['cores']}|{hardware['cuda_devices']}"
+
+
+def estimated_memory(model_name, config):
+    """模型權重加上每個 worker 的解碼緩衝，粗估所需記憶體 (bytes)
+
+    未列出的 compute_type（auto、int16、bfloat16、default 等）以 float32 估計。
+    """
+    weights = MODEL_PARAMETERS.get(model_name, MODEL_PARAMETERS["medium"]) * BYTES_PER_WEIGHT.get(config.get("compute_type"), 4)
+    return weights * 1.2 + 300 * 1024 ** 2 * config.get("num_workers", 1)
+
+
+def candidate_configs(hardware, model_name="medium"):
+    """要實測的設定組合（排除記憶體不足的組合）"""
+    if hardware["cuda_devices"]:
+        return [{"device": "cuda", "compute_type": ct} for ct in CUDA_COMPUTE_TYPES]
+
+    cores = hardware["cores"]
+    compute_types = [ct for ct in CPU_COMPUTE_TYPES if ct in hardware["cpu_compute_types"]]
+    # 引擎一次只轉錄一個檔案：量測單一轉錄在不同執行緒數下的速度。
+    # cpu_threads 為總執行緒數，平行模式與分段轉錄由 split_device_config 再平分
+    thread_counts = {cores}
+    if cores >= 4:
+        thread_counts.add(cores // 2)  # 開啟超執行緒的機器，實體核心數常比邏輯核心數快
+    configs = [
+        {"device": "cpu", "compute_type": ct, "cpu_threads": threads, "num_workers": 1}
+        for ct in compute_types
+        for threads in sorted(thread_counts)
+    ]
+    available = hardware["memory_available"]
+    if available:
+        configs = [c for c in configs if estimated_memory(model_name, c) < available]
+    return configs
+
+
+def synthetic_speech(seconds=BENCHMARK_SECONDS, seed=0):
+    """產生類語音的合成訊號：帶諧波的變動基頻，以音節速率開關"""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 40 * np.sin(2 * math.pi * 0.7 * t) + 10 * rng.standard_normal(len(t)).cumsum() / SAMPLE_RATE
+    phase = 2 * math.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voice = sum(np.sin(k * phase) / k for k in range(1, 8))
+    syllables = (np.sin(2 * math.pi * 4 * t) > -0.3).astype(np.float32)
+    audio = voice * syllables + 0.01 * rng.standard_normal(len(t))
+    return (0.3 * audio / np.max(np.abs(audio))).astype(np.float32)
+
+
+def benchmark_config(model_name, config, audio):
+    """載入模型並轉錄一次（與引擎相同的逐檔轉錄），回傳 realtime factor（越小越快）"""
+    from faster_whisper import WhisperModel
+
+    model = WhisperModel(model_name, **config)
+    # 暖機：第一次呼叫包含配置記憶體等一次性成本
+    list(model.transcribe(audio[:SAMPLE_RATE * 5], **BENCHMARK_OPTIONS)[0])
+
+    start = time.time()
+    list(model.transcribe(audio, **BENCHMARK_OPTIONS)[0])
+    elapsed = time.time() - start
+    return elapsed / (len(audio) / SAMPLE_RATE)
+
+
+def load_tuned(path=CONFIG_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_tuned_config(model_name, hardware=None, path=CONFIG_PATH):
+    """回傳已保存的最佳設定；沒有調校過時回傳 None"""
+    tuned = load_tuned(path)
+    if not tuned:
+        return None
+    hardware = hardware or detect_hardware()
+    entry = tuned.get(f"{machine_key(hardware)}|{model_name}")
+    if not entry:
+        return None
+    return dict(entry["config"])
+
+
+def save_tuned(model_name, hardware, config, rtf, results, path=CONFIG_PATH):
+    tuned = load_tuned(path)
+    tuned[f"{machine_key(hardware)}|{model_name}"] = {
+        "config": config,
+        "rtf": rtf,
+        "results": results,
+        "hardware": hardware,
+        "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(tuned, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def autotune(model_name, audio=None, log=print, path=CONFIG_PATH):
+    """實測所有候選設定，保存並回傳最快的一組"""
+    hardware = detect_hardware()
+    memory = hardware["memory_total"]
+    log(f"CPU: {hardware['cpu_model']} ({hardware['cores']} 核心)")
+    log(f"記憶體: {memory / 1024 ** 3:.1f} GB" if memory else "記憶體: 未知")
+    log(f"指令集: {', '.join(hardware['instructions']) or '未知'}")
+    log(f"CUDA 裝置: {hardware['cuda_devices']}")
+
+    if audio is None:
+        audio = synthetic_speech()
+
+    results = []
+    for config in candidate_configs(hardware, model_name):
+        label = ", ".join(f"{k}={v}" for k, v in config.items())
+        try:
+            rtf = benchmark_config(model_name, config, audio)
+        except Exception as e:
+            log(f"✖ {label}: {e}")
+            continue
+        log(f"  {label}: RTF {rtf:.3f}")
+        results.append({"config": config, "rtf": rtf})
+
+    if not results:
+        raise RuntimeError("所有候選設定都無法執行")
+
+    best = min(results, key=lambda r: r["rtf"])
+    save_tuned(model_name, hardware, best["config"], best["rtf"], results, path)
+    log(f"✓ 最佳設定: {best['config']} (RTF {best['rtf']:.3f})，已保存至 {path}")
+    return best["config"]
+
+
+def _load_audio_file(path):
+    from faster_whisper import decode_audio
+    return decode_audio(path, sampling_rate=SAMPLE_RATE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Whisper 裝置設定自動調校")
+    parser.add_argument("-m", "--model", default="medium", help="要調校的模型 (預設: medium)")
+    parser.add_argument("--audio", default=None, help="以實際音訊取代內建的合成訊號")
+    parser.add_argument("--show", action="store_true", help="只顯示已保存的結果")
+    args = parser.parse_args()
+
+    if args.show:
+        config = get_tuned_config(args.model)
+        print(config if config else "尚未調校此模型")
+    else:
+        autotune(args.model, _load_audio_file(args.audio) if args.audio else None)
@@ -0,0 +1,358 @@
+"""效能基準測試：量測啟動時的匯入時間、模型載入、轉錄速度、逐段後處理與字幕格式化的吞吐量
+
+用法:
+    python benchmark.py                                   # 匯入時間 + 後處理 + 格式化（不需模型）
+    python benchmark.py --suite all --models tiny,base    # 含模型載入與轉錄
+    python benchmark.py --suite import --import-report importtime.txt   # 另存 -X importtime 明細
+    python benchmark.py --output result.json --compare baseline.json
+結果以 JSON 輸出；指定 --compare 時逐項與基準比較，任一項退步超過 --tolerance 即以代碼 1 結束。
+"""
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+from autotune import SAMPLE_RATE, detect_hardware, synthetic_speech
+from srt_io import SrtStreamWriter, iter_srt_file
+
+SAMPLE_SRT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "11月24日_cht_1.txt")
+
+SUITES = ("import", "load", "rtf", "postprocess", "format")
+DEFAULT_SUITES = ("import", "postprocess", "format")
+# 量測匯入時間的進入點：命令列工具與 GUI 啟動時不應匯入 faster-whisper、OpenCC 等重量級模組
+DEFAULT_IMPORT_MODULES = ("cli", "transcriber", "format_subtitles")
+HEAVY_MODULES = ("faster_whisper", "ctranslate2", "av", "numpy", "opencc", "tokenizers", "onnxruntime")
+DEFAULT_FORMAT_SCALES = (1, 100, 1000)
+DEFAULT_AUDIO_LENGTHS = (30, 120)
+DEFAULT_TOLERANCE = 0.10
+MIN_MEASURE_SECONDS = 0.5
+
+
+def metric(value, unit, better="lower"):
+    """better: lower（時間類）或 higher（吞吐量類）"""
+    return {"value": value, "unit": unit, "better": better}
+
+
+def best_of(func, repeat, min_time=MIN_MEASURE_SECONDS):
+    """回傳單次呼叫的最短耗時（秒）
+
+    與 timeit 相同：短的工作自動重複到每輪至少 min_time 秒，再取 repeat 輪中最快的一輪，
+    降低計時誤差與背景干擾。
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9)) + 1)
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            func()
+        best = min(best, (time.perf_counter() - start) / loops)
+    return best
+
+
+def write_wav(path, audio):
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype("<i2").tobytes())
+
+
+def scaled_sample(path, scale):
+    """把範例字幕重複 scale 次（序號與時間軸接續），寫入 path，回傳區塊數"""
+    blocks = list(iter_srt_file(SAMPLE_SRT))
+    span = blocks[-1].end_ms
+    with open(path, "w", encoding="utf-8") as f:
+        writer = SrtStreamWriter(f)
+        for copy in range(scale):
+            offset = copy * span
+            for block in blocks:
+                writer.write(block._replace(
+                    index=block.index + copy * len(blocks),
+                    start_ms=block.start_ms + offset,
+                    end_ms=block.end_ms + offset,
+                ))
+    return writer.count
+
+
+# --- 各項測試 ---
+
+def import_profile(module):
+    """在新的直譯器以 -X importtime 匯入 module，回傳 (總毫秒, [(累計毫秒, 自身毫秒, 模組名稱)])
+
+    無法匯入時（例如未安裝 GUI 套件）回傳 None。
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if proc.returncode != 0:
+        return None
+    rows = []
+    total_us = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        if not name.startswith("  "):  # 只有最外層的匯入加總才不會重複計算
+            total_us += int(cumulative_us)
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, name.rstrip()))
+    return total_us / 1000, rows
+
+
+def bench_import(modules, repeat, report=None):
+    """各進入點的冷啟動匯入時間（取 repeat 次中最快的一次）與匯入的重量級模組數"""
+    results = {}
+    for module in modules:
+        profiles = [import_profile(module) for _ in range(repeat)]
+        if None in profiles:
+            continue
+        total, rows = min(profiles, key=lambda profile: profile[0])
+        names = {name.strip() for _, _, name in rows}
+        heavy = [name for name in HEAVY_MODULES if name in names]
+        results[f"import.{module}.ms"] = metric(total, "ms")
+        results[f"import.{module}.heavy_modules"] = metric(len(heavy), "modules")
+        if report:
+            report.write(f"# {module}: {total:.1f} ms，重量級模組: {', '.join(heavy) or '無'}\n")
+            report.write("# 累計 ms | 自身 ms | 模組\n")
+            for cumulative, own, name in rows:
+                report.write(f"{cumulative:10.1f} | {own:8.1f} | {name}\n")
+            report.write("\n")
+    return results
+
+
+def bench_load(models, device_config, repeat):
+    from faster_whisper import WhisperModel
+
+    results = {}
+    for name in models:
+        WhisperModel(name, **device_config)  # 第一次可能需要下載，不計時
+        seconds = best_of(lambda: WhisperModel(name, **device_config), repeat)
+        results[f"load.{name}.seconds"] = metric(seconds, "s")
+    return results
+
+
+def bench_rtf(models, device_config, lengths, workdir):
+    from engine import TranscriptionEngine
+
+    results = {}
+    for name in models:
+        engine = TranscriptionEngine(model_name=name, device_config=device_config, log=lambda message: None)
+        engine.load_model()
+        for seconds in lengths:
+            path = os.path.join(workdir, f"synthetic_{seconds}s.wav")
+            write_wav(path, synthetic_speech(seconds))
+            start = time.perf_counter()
+            if not engine.process_single_file(path):
+                raise RuntimeError(f"轉錄失敗: {path}")
+            elapsed = time.perf_counter() - start
+            results[f"rtf.{name}.{seconds}s"] = metric(elapsed / seconds, "x realtime")
+    return results
+
+
+def bench_postprocess(repeat):
+    """以範例字幕的每一段文字模擬轉錄片段，量測每段的後處理成本"""
+    from opencc import OpenCC
+    from postprocess import SegmentPostProcessor, format_segment_text, split_subtitle_lines, to_fullwidth
+
+    cc = OpenCC("s2twp")
+    postprocessor = SegmentPostProcessor()
+    texts = ["".join(block.lines) for block in iter_srt_file(SAMPLE_SRT)]
+    converted = [cc.convert(text) for text in texts]
+    widened = [to_fullwidth(text) for text in converted]
+    count = len(texts)
+
+    stages = {
+        "opencc": lambda: [cc.convert(text) for text in texts],
+        "punctuation": lambda: [to_fullwidth(text) for text in converted],
+        "split_lines": lambda: [split_subtitle_lines(text) for text in widened],
+        "total": lambda: [format_segment_text(cc.convert(text)) for text in texts],
+        # 引擎實際使用的路徑（每輪清空快取，只有範例中真正重複的文字會命中）
+        "memoized": lambda: _postprocess_memoized(postprocessor, texts),
+    }
+    return {
+        f"postprocess.{name}.us_per_segment": metric(best_of(func, repeat) / count * 1e6, "us")
+        for name, func in stages.items()
+    }
+
+
+def _postprocess_memoized(postprocessor, texts):
+    postprocessor.clear()
+    return [postprocessor.format(postprocessor.convert(text)) for text in texts]
+
+
+def bench_format(scales, repeat, workdir):
+    from format_subtitles import format_subtitles
+    from rules import load_rules
+
+    rules = load_rules()
+    results = {}
+    for scale in scales:
+        input_file = os.path.join(workdir, f"sample_x{scale}.srt")
+        output_file = os.path.join(workdir, f"sample_x{scale}_formatted.srt")
+        blocks = scaled_sample(input_file, scale)
+        size = os.path.getsize(input_file)
+        seconds = best_of(lambda: format_subtitles(input_file, output_file, rules), repeat)
+        results[f"format.x{scale}.blocks_per_sec"] = metric(blocks / seconds, "blocks/s", "higher")
+        results[f"format.x{scale}.mb_per_sec"] = metric(size / 1024 / 1024 / seconds, "MB/s", "higher")
+        os.remove(input_file)
+        os.remove(output_file)
+    return results
+
+
+# --- 比較 ---
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """回傳 [(名稱, 基準值, 目前值, 變化比例, 是否退步)]；變化比例為正表示變好"""
+    rows = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        if not previous["value"]:
+            # 基準為 0 的計數（例如啟動時匯入的重量級模組數）：只要出現就算 100% 的變化
+            if not current["value"]:
+                continue
+            ratio = 1.0
+        else:
+            ratio = current["value"] / previous["value"] - 1
+        change = ratio if current["better"] == "higher" else -ratio
+        rows.append((name, previous["value"], current["value"], change, change < -tolerance))
+    return rows
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    hardware = detect_hardware()
+    return {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_model": hardware["cpu_model"],
+        "cores": hardware["cores"],
+    }
+
+
+def run(suites, models=("tiny",), audio_lengths=DEFAULT_AUDIO_LENGTHS,
+        format_scales=DEFAULT_FORMAT_SCALES, repeat=3, device_config=None,
+        import_modules=DEFAULT_IMPORT_MODULES, import_report=None, log=print):
+    from engine import get_device_config
+
+    results = {}
+    workdir = tempfile.mkdtemp(prefix="mp3-transcriber-bench-")
+    try:
+        if "import" in suites:
+            log("• 匯入時間")
+            results.update(bench_import(import_modules, repeat, import_report))
+        if "postprocess" in suites:
+            log("• 逐段後處理")
+            results.update(bench_postprocess(repeat))
+        if "format" in suites:
+            log("• 字幕格式化")
+            results.update(bench_format(format_scales, repeat, workdir))
+        if "load" in suites or "rtf" in suites:
+            device_config = device_config or get_device_config(lambda message: None)
+            if "load" in suites:
+                log("• 模型載入")
+                results.update(bench_load(models, device_config, repeat))
+            if "rtf" in suites:
+                log("• 轉錄速度")
+                results.update(bench_rtf(models, device_config, audio_lengths, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _csv(value, cast=str):
+    return tuple(cast(item) for item in value.split(",") if item)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="效能基準測試")
+    parser.add_argument("--suite", default=",".join(DEFAULT_SUITES),
+                        help=f"要執行的項目，以逗號分隔: {', '.join(SUITES)} 或 all (預設: {','.join(DEFAULT_SUITES)})")
+    parser.add_argument("--models", default="tiny", help="模型載入與轉錄使用的模型 (預設: tiny)")
+    parser.add_argument("--audio-lengths", default=",".join(map(str, DEFAULT_AUDIO_LENGTHS)),
+                        help="合成音訊長度 (秒)")
+    parser.add_argument("--format-scales", default=",".join(map(str, DEFAULT_FORMAT_SCALES)),
+                        help="範例字幕放大倍數")
+    parser.add_argument("--import-modules", default=",".join(DEFAULT_IMPORT_MODULES),
+                        help="量測匯入時間的模組（無法匯入的模組略過）")
+    parser.add_argument("--import-report", default=None, help="將各模組的 -X importtime 明細寫入此檔案")
+    parser.add_argument("--repeat", type=int, default=3, help="每項重複次數，取最佳值 (預設: 3)")
+    parser.add_argument("-o", "--output", default=None, help="結果 JSON 輸出路徑 (預設: 印在標準輸出)")
+    parser.add_argument("--compare", default=None, help="與此基準 JSON 比較")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"容許的退步比例 (預設: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+
+    suites = SUITES if args.suite == "all" else _csv(args.suite)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"未知的項目: {', '.join(sorted(unknown))}")
+
+    log = lambda message: print(message, file=sys.stderr, flush=True)
+    import_report = open(args.import_report, "w", encoding="utf-8") if args.import_report else None
+    try:
+        results = run(
+            suites,
+            models=_csv(args.models),
+            audio_lengths=_csv(args.audio_lengths, int),
+            format_scales=_csv(args.format_scales, int),
+            repeat=args.repeat,
+            import_modules=_csv(args.import_modules),
+            import_report=import_report,
+            log=log,
+        )
+    finally:
+        if import_report:
+            import_report.close()
+    report = {"environment": environment(), "results": results}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        log(f"✓ 結果已寫入 {args.output}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=1))
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = 0
+    for name, previous, current, change, regressed in compare(results, baseline, args.tolerance):
+        mark = "✖" if regressed else "✓"
+        log(f"{mark} {name}: {previous:.4g} -> {current:.4g} ({change:+.1%})")
+        regressions += regressed
+    if regressions:
+        log(f"✖ {regressions} 項退步超過 {args.tolerance:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+"""轉錄結果快取：以音訊內容雜湊與解碼設定為鍵，命中時完全略過 model.transcribe
+
+用法:
+    python cache.py              # 顯示快取統計
+    python cache.py --clear      # 清空快取
+"""
+import os
+import json
+import hashlib
+import argparse
+import tempfile
+from collections import namedtuple
+
+from chunking import pack_segment, unpack_segment
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "transcripts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_VERSION = 1
+
+CachedInfo = namedtuple("CachedInfo", ["duration", "duration_after_vad", "language", "language_probability"])
+
+
+def hash_file(path, block_size=1024 * 1024):
+    """以 SHA-256 計算檔案內容雜湊"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """磁碟上的原始片段快取，超過容量時依最近使用時間淘汰 (LRU)"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, file_path, settings):
+        """音訊雜湊 + 解碼設定 -> 快取鍵"""
+        payload = json.dumps(
+            {"version": CACHE_VERSION, "audio": hash_file(file_path), "settings": settings},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """命中時回傳 (片段清單, info)，否則回傳 None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        # 更新存取時間作為 LRU 依據
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        self.hits += 1
+        segments = [unpack_segment(seg) for seg in data["segments"]]
+        return segments, CachedInfo(**data["info"])
+
+    def put(self, key, segments, info):
+        """寫入一筆結果（先寫暫存檔再改名，多個行程同時寫入也安全）"""
+        data = {
+            "segments": [pack_segment(seg) for seg in segments],
+            "info": {
+                "duration": info.duration,
+                "duration_after_vad": getattr(info, "duration_after_vad", info.duration),
+                "language": getattr(info, "language", None),
+                "language_probability": getattr(info, "language_probability", None),
+            },
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.stores += 1
+        self.evict()
+
+    def record(self, key, segments, info):
+        """邊輸出片段邊收集，完整跑完才寫入快取（取消時不寫入）"""
+        collected = []
+        for seg in segments:
+            collected.append(seg)
+            yield seg
+        self.put(key, collected, info)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def evict(self):
+        """總大小超過上限時，從最久未使用的項目開始刪除"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        """回傳統計資料"""
+        entries = self._entries()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def stats_report(self):
+        """統計資料的文字摘要"""
+        s = self.stats()
+        return (
+            f"快取: {s['entries']} 筆 / {s['bytes'] / 1024 / 1024:.1f} MB "
+            f"(上限 {s['max_bytes'] / 1024 / 1024:.0f} MB) | "
+            f"命中 {s['hits']} / 未命中 {s['misses']} ({s['hit_rate']:.0%}) | "
+            f"淘汰 {s['evictions']}"
+        )
+
+    def clear(self):
+        """清空快取"""
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="轉錄結果快取管理")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="快取資料夾")
+    parser.add_argument("--clear", action="store_true", help="清空快取")
+    args = parser.parse_args()
+
+    cache = TranscriptionCache(args.cache_dir)
+    if args.clear:
+        cache.clear()
+        print("✓ 快取已清空")
+    print(cache.stats_report())
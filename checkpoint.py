@@ -0,0 +1,131 @@
+"""可續跑的批次：記錄已完成檔案的工作清單，以及逐段寫入的片段日誌"""
+import os
+import json
+import hashlib
+import tempfile
+
+from chunking import Segment, pack_segment, shift_words, unpack_segment
+
+
+def _file_signature(path):
+    """以絕對路徑、大小與修改時間辨識檔案；檔案被修改後視為新工作"""
+    st = os.stat(path)
+    return {"path": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime}
+
+
+class SegmentJournal:
+    """單一檔案的片段日誌：每完成一段就附加一行 JSON 並 flush"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """讀取已記錄的片段；行程中斷時最後一行可能不完整，讀到壞行即停止"""
+        segments = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        segments.append(unpack_segment(json.loads(line)))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return segments
+
+    def record(self, segments):
+        """邊輸出片段邊寫入日誌"""
+        with open(self.path, "a", encoding="utf-8") as f:
+            for seg in segments:
+                f.write(json.dumps(pack_segment(seg), ensure_ascii=False) + "\n")
+                f.flush()
+                yield seg
+
+    def discard(self):
+        """檔案完成後刪除日誌"""
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class ResumedInfo:
+    """續跑時的 info：時間長度加回已完成的部分"""
+
+    def __init__(self, info, offset):
+        self.info = info
+        self.offset = offset
+
+    @property
+    def duration(self):
+        return self.offset + self.info.duration
+
+    @property
+    def duration_after_vad(self):
+        # 已完成的部分無 VAD 統計，視為全部是語音
+        return self.offset + getattr(self.info, "duration_after_vad", self.info.duration)
+
+
+def shift_segments(segments, offset):
+    """將片段時間平移 offset 秒"""
+    for seg in segments:
+        yield Segment(seg.start + offset, seg.end + offset, seg.text, shift_words(getattr(seg, "words", None), offset))
+
+
+class JobManifest:
+    """工作清單 (manifest.json) 與各檔案的片段日誌 (journals/)"""
+
+    def __init__(self, job_dir):
+        self.job_dir = job_dir
+        self.manifest_path = os.path.join(job_dir, "manifest.json")
+        self.journal_dir = os.path.join(job_dir, "journals")
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.completed = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("completed", {})
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.job_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"completed": self.completed}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.manifest_path)
+
+    def is_done(self, path):
+        """檔案是否已完成（且之後未被修改）"""
+        try:
+            signature = _file_signature(path)
+        except OSError:
+            return False
+        return self.completed.get(signature["path"]) == signature
+
+    def mark_done(self, path):
+        """記錄檔案已完成"""
+        signature = _file_signature(path)
+        self.completed[signature["path"]] = signature
+        self._save()
+
+    def journal(self, path, settings=None):
+        """取得檔案的片段日誌
+
+        settings 為會影響轉錄結果的設定（模型、beam_size、VAD 等）；設定不同時使用不同的日誌，
+        換了設定重跑不會把舊設定的片段接到新的輸出。
+        """
+        signature = _file_signature(path)
+        payload = {"file": signature, "settings": settings}
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+        return SegmentJournal(os.path.join(self.journal_dir, f"{key}.jsonl"))
+
+    def clear(self):
+        """整批完成後清除工作狀態"""
+        self.completed = {}
+        self._save()
+        for name in os.listdir(self.journal_dir):
+            try:
+                os.remove(os.path.join(self.journal_dir, name))
+            except OSError:
+                pass
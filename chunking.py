@@ -0,0 +1,193 @@
+"""長檔分段轉錄：切成帶重疊的時間區段平行轉錄，再縫合為連續的片段"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+SAMPLE_RATE = 16000
+
+# 縫合後的片段，欄位與 faster-whisper 的 Segment 相容（start / end / text / words）；
+# 未要求 word_timestamps 時 words 為 None
+Segment = namedtuple("Segment", ["start", "end", "text", "words"], defaults=(None,))
+Word = namedtuple("Word", ["start", "end", "word", "probability"])
+
+
+def shift_words(words, offset):
+    """將逐字時間平移 offset 秒（同時轉成 Word，可序列化）"""
+    if words is None:
+        return None
+    return tuple(Word(w.start + offset, w.end + offset, w.word, w.probability) for w in words)
+
+
+def pack_segment(seg):
+    """片段 -> JSON 清單 [start, end, text]，有逐字時間時附加 [[start, end, word, probability], ...]"""
+    data = [seg.start, seg.end, seg.text]
+    words = getattr(seg, "words", None)
+    if words:
+        data.append([[w.start, w.end, w.word, w.probability] for w in words])
+    return data
+
+
+def unpack_segment(data):
+    """pack_segment 的反向"""
+    start, end, text, *rest = data
+    words = tuple(Word(*w) for w in rest[0]) if rest else None
+    return Segment(start, end, text, words)
+
+
+def drop_words(words, count):
+    """移除開頭 count 個字元所對應的逐字時間（縫合時去除重複文字用）"""
+    if not words or count <= 0:
+        return words
+    kept = list(words)
+    while kept and count > 0:
+        count -= len(kept.pop(0).word.strip())
+    return tuple(kept)
+
+
+class ChunkedInfo:
+    """分段轉錄的 info；duration_after_vad 隨各區段完成而累加"""
+
+    def __init__(self, duration, chunks):
+        self.duration = duration
+        self.chunks = chunks
+        self.duration_after_vad = duration
+
+
+def plan_chunks(duration, chunk_length, overlap):
+    """回傳 [(開始秒, 結束秒), ...]，相鄰區段重疊 overlap 秒"""
+    if duration <= chunk_length:
+        return [(0.0, duration)]
+
+    step = chunk_length - overlap
+    chunks = []
+    start = 0.0
+    while start < duration:
+        end = min(start + chunk_length, duration)
+        # 最後一段太短時併入前一段（只處理結尾，否則後面的音訊會被略過）
+        if chunks and end >= duration and end - start <= overlap * 2:
+            chunks[-1] = (chunks[-1][0], end)
+            break
+        chunks.append((start, end))
+        if end >= duration:
+            break
+        start += step
+    return chunks
+
+
+def strip_overlap(prev_text, next_text, min_length=2):
+    """移除 next_text 開頭與 prev_text 結尾重複的文字（至少 min_length 字才視為重複）"""
+    for k in range(min(len(prev_text), len(next_text)), min_length - 1, -1):
+        if prev_text.endswith(next_text[:k]):
+            return next_text[k:]
+    return next_text
+
+
+class ChunkStitcher:
+    """依區段順序逐一縫合：重疊區以中點為界，去除重複文字並保持時間遞增"""
+
+    def __init__(self, chunks, overlap):
+        self.chunks = chunks
+        self.overlap = overlap
+        self.last = None
+
+    def _bounds(self, idx):
+        start, end = self.chunks[idx]
+        lower = start + self.overlap / 2 if idx > 0 else float("-inf")
+        upper = end - self.overlap / 2 if idx < len(self.chunks) - 1 else float("inf")
+        return lower, upper
+
+    def owned_range(self, idx):
+        """第 idx 段實際負責的時間範圍（以重疊區中點為界）"""
+        lower, upper = self._bounds(idx)
+        start, end = self.chunks[idx]
+        return max(lower, start), min(upper, end)
+
+    def feed(self, idx, segments):
+        """加入第 idx 段的片段（時間已換算回原始時間軸），回傳可輸出的片段"""
+        lower, upper = self._bounds(idx)
+        ready = []
+        first = True
+        for seg in segments:
+            # 每個片段只歸屬於中點所在的區段
+            middle = (seg.start + seg.end) / 2
+            if not (lower <= middle < upper):
+                continue
+
+            start, end, text, words = seg.start, seg.end, seg.text, seg.words
+            if first and self.last is not None:
+                stripped = text.strip()
+                text = strip_overlap(self.last.text.strip(), stripped)
+                if not text:
+                    continue
+                words = drop_words(words, len(stripped) - len(text))
+            first = False
+
+            if self.last is not None:
+                start = max(start, self.last.start)
+                if self.last.end > start:
+                    self.last = self.last._replace(end=start)
+            end = max(end, start)
+
+            if self.last is not None:
+                ready.append(self.last)
+            self.last = Segment(start, end, text, words)
+        return ready
+
+    def finish(self):
+        """取出最後一個保留的片段"""
+        ready = [self.last] if self.last is not None else []
+        self.last = None
+        return ready
+
+
+def _transcribe_chunk(model, audio, offset, options):
+    segments, info = model.transcribe(audio, **options)
+    segments = [
+        Segment(seg.start + offset, seg.end + offset, seg.text, shift_words(seg.words, offset))
+        for seg in segments
+    ]
+    return segments, info
+
+
+def _stitched(executor, futures, stitcher, info):
+    try:
+        info.duration_after_vad = 0.0
+        for idx, future in enumerate(futures):
+            segments, chunk_info = future.result()
+            # 重疊區會被相鄰兩段各算一次，依各段實際負責的長度比例折算
+            lower, upper = stitcher.owned_range(idx)
+            if chunk_info.duration > 0:
+                share = (upper - lower) / chunk_info.duration
+                speech = getattr(chunk_info, "duration_after_vad", chunk_info.duration)
+                info.duration_after_vad += speech * share
+            yield from stitcher.feed(idx, segments)
+        yield from stitcher.finish()
+    finally:
+        # 取消或中途離開時不再排程剩下的區段
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def transcribe_chunked(model, audio, chunk_length=600.0, overlap=5.0, workers=2, **options):
+    """與 model.transcribe 相同的介面：audio 可為檔案路徑或已解碼的取樣，回傳 (片段產生器, info)"""
+    if isinstance(audio, str):
+        from faster_whisper import decode_audio
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+    duration = len(audio) / SAMPLE_RATE
+
+    chunks = plan_chunks(duration, chunk_length, overlap)
+    if len(chunks) == 1:
+        return model.transcribe(audio, **options)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [
+        executor.submit(
+            _transcribe_chunk,
+            model,
+            audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)],
+            start,
+            options,
+        )
+        for start, end in chunks
+    ]
+    info = ChunkedInfo(duration=duration, chunks=len(chunks))
+    segments = _stitched(executor, futures, ChunkStitcher(chunks, overlap), info)
+    return segments, info
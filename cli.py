@@ -0,0 +1,162 @@
+"""命令列批次轉錄（不需要顯示環境）
+
+用法:
+    python cli.py 錄音.mp3 資料夾/ --model medium
+"""
+import argparse
+import multiprocessing
+import sys
+
+from autotune import autotune
+from audio_store import DEFAULT_MAX_BYTES as AUDIO_STORE_MAX_BYTES, DEFAULT_STORE_DIR as AUDIO_STORE_DIR
+from cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from engine import TranscriptionEngine, collect_audio_files
+from linebreak import DEFAULT_MAX_LINES
+from models import ModelRegistry
+from parallel import process_batch_parallel
+from writers import DEFAULT_FORMATS, WRITERS
+
+
+MODEL_CHOICES = ["tiny", "base", "small", "medium", "large-v2", "large-v3"]
+
+
+def format_list(value):
+    """以逗號分隔的輸出格式，例如 srt,vtt,json"""
+    formats = tuple(dict.fromkeys(item.strip() for item in value.split(",") if item.strip()))
+    unknown = [name for name in formats if name not in WRITERS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(f"未知的輸出格式: {', '.join(unknown) or value}（可用: {', '.join(WRITERS)}）")
+    return formats
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="MP3 轉繁體中文字幕 (命令列版)")
+    parser.add_argument("inputs", nargs="+", help="音訊檔案或資料夾")
+    parser.add_argument("-m", "--model", default="medium", choices=MODEL_CHOICES, help="Whisper 模型 (預設: medium)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="遞迴搜尋子資料夾")
+    parser.add_argument("--device", default=None, help="指定裝置 (cpu / cuda)，預設自動偵測")
+    parser.add_argument("--compute-type", default=None, help="指定 compute_type (例如 int8, float16)")
+    parser.add_argument("--autotune", action="store_true", help="轉錄前先實測並保存此機器最快的裝置設定")
+    parser.add_argument("--beam-size", type=int, default=5, help="beam search 大小 (預設: 5)")
+    parser.add_argument("-j", "--workers", type=int, default=1, help="平行 worker 行程數 (預設: 1，0 表示使用全部核心)")
+    parser.add_argument("--chunk-length", type=float, default=0, help="長檔分段長度 (秒)，超過此長度的檔案切段平行轉錄，0 表示關閉")
+    parser.add_argument("--chunk-overlap", type=float, default=5.0, help="相鄰區段重疊秒數 (預設: 5)")
+    parser.add_argument("--chunk-workers", type=int, default=2, help="同時轉錄的區段數 (預設: 2)")
+    parser.add_argument("--vad", action="store_true", help="轉錄前以 VAD 略過靜音與非語音段落")
+    parser.add_argument("--vad-threshold", type=float, default=None, help="VAD 語音判定門檻 (0-1)")
+    parser.add_argument("--vad-min-silence-ms", type=int, default=None, help="超過此長度 (毫秒) 的靜音才略過")
+    parser.add_argument("--vad-speech-pad-ms", type=int, default=None, help="語音段前後保留的緩衝 (毫秒)")
+    parser.add_argument("-f", "--formats", type=format_list, default=DEFAULT_FORMATS,
+                        help=f"輸出格式，以逗號分隔，一次轉錄同時寫出 (可用: {', '.join(WRITERS)}；預設: {','.join(DEFAULT_FORMATS)})")
+    parser.add_argument("--word-timestamps", action="store_true", help="記錄逐字時間，寫入 JSON 輸出的 words 欄位")
+    parser.add_argument("--max-lines", type=int, default=DEFAULT_MAX_LINES, help=f"每個字幕區塊最多幾行，超過時拆成多個區塊並依字數分配時間 (預設: {DEFAULT_MAX_LINES}，0 表示不限制)")
+    parser.add_argument("--cache", action="store_true", help="啟用轉錄結果快取，相同音訊與設定不重新轉錄")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="快取資料夾")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), help="快取容量上限 (MB)")
+    parser.add_argument("--audio-store", action="store_true", help="解碼後的音訊保存為 memmap 檔，重跑與多個 worker 共用，不重複解碼")
+    parser.add_argument("--audio-store-dir", default=AUDIO_STORE_DIR, help="音訊儲存區資料夾")
+    parser.add_argument("--audio-store-max-mb", type=int, default=AUDIO_STORE_MAX_BYTES // (1024 * 1024), help="音訊儲存區容量上限 (MB)")
+    parser.add_argument("--job-dir", default=None, help="工作狀態資料夾：記錄已完成檔案與逐段日誌，中斷後以相同參數重跑即可續跑")
+    parser.add_argument("--preload", action="store_true", help="啟動時即在背景載入模型，與快取比對等前置作業同時進行")
+    parser.add_argument("--model-memory-mb", type=int, default=None, help="常駐模型的記憶體預算 (MB)，預設為實體記憶體的一半")
+    parser.add_argument("--prefetch", type=int, default=1, help="轉錄時在背景預先解碼接下來的檔案數 (預設: 1，0 表示關閉)")
+    parser.add_argument("--metrics-log", default=None, help="每個檔案的分段計時以 JSON 行附加到此檔案")
+    parser.add_argument("--metrics-file", default=None, help="批次統計以 Prometheus 文字格式寫入此檔案 (可供 node_exporter textfile collector 讀取)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不輸出每個片段的內容")
+    return parser
+
+
+def vad_parameters(args):
+    """只傳入使用者有指定的 VAD 參數，其餘沿用 faster-whisper 預設值"""
+    params = {
+        "threshold": args.vad_threshold,
+        "min_silence_duration_ms": args.vad_min_silence_ms,
+        "speech_pad_ms": args.vad_speech_pad_ms,
+    }
+    return {k: v for k, v in params.items() if v is not None} or None
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.chunk_length and args.chunk_overlap >= args.chunk_length / 2:
+        parser.error("--chunk-overlap 必須小於 --chunk-length 的一半")
+    if args.workers != 1 and (args.preload or args.model_memory_mb):
+        # 平行模式每個 worker 啟動時就各自載入一份模型，這兩個選項只作用於單一行程
+        parser.error("--preload 與 --model-memory-mb 只能用於單一行程 (--workers 1)")
+
+    file_paths = collect_audio_files(args.inputs, recursive=args.recursive)
+    if not file_paths:
+        print("✖ 找不到可處理的音訊檔案", file=sys.stderr)
+        return 1
+
+    device_config = None
+    if args.device or args.compute_type:
+        device_config = {
+            "device": args.device or "cpu",
+            "compute_type": args.compute_type or "int8",
+        }
+
+    def log(message):
+        # 安靜模式只保留狀態訊息，略過逐段內容
+        if args.quiet and message.startswith(("[", "  第")):
+            return
+        print(message, flush=True)
+
+    if args.autotune and device_config is None:
+        # 結果會保存下來，之後的執行由 get_device_config 自動採用
+        device_config = autotune(args.model, log=log)
+
+    engine_options = dict(
+        beam_size=args.beam_size,
+        chunk_length=args.chunk_length,
+        chunk_overlap=args.chunk_overlap,
+        chunk_workers=args.chunk_workers,
+        vad_filter=args.vad,
+        vad_parameters=vad_parameters(args),
+        cache_dir=args.cache_dir if args.cache else None,
+        cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+        audio_store_dir=args.audio_store_dir if args.audio_store else None,
+        audio_store_max_bytes=args.audio_store_max_mb * 1024 * 1024,
+        job_dir=args.job_dir,
+        max_lines=args.max_lines,
+        output_formats=args.formats,
+        word_timestamps=args.word_timestamps,
+        metrics_log=args.metrics_log,
+        metrics_file=args.metrics_file,
+        prefetch_depth=args.prefetch,
+    )
+
+    try:
+        if args.workers != 1 and len(file_paths) > 1:
+            result = process_batch_parallel(
+                file_paths,
+                model_name=args.model,
+                workers=args.workers or None,
+                device_config=device_config,
+                log=log,
+                **engine_options,
+            )
+        else:
+            memory_budget = args.model_memory_mb * 1024 * 1024 if args.model_memory_mb else None
+            engine = TranscriptionEngine(
+                model_name=args.model,
+                device_config=device_config,
+                log=log,
+                models=ModelRegistry(memory_budget, log=log),
+                **engine_options,
+            )
+            if args.preload:
+                engine.prewarm()
+            result = engine.process_batch(file_paths)
+    except KeyboardInterrupt:
+        print("\n✖ 使用者中斷", file=sys.stderr)
+        return 130
+
+    return 0 if result["successful"] == result["total"] else 1
+
+
+if __name__ == "__main__":
+    # 打包後的執行檔 (cli.spec)：--workers 的子行程需由此進入 worker，而不是重新執行命令列
+    multiprocessing.freeze_support()
+    sys.exit(main())
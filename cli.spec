@@ -0,0 +1,63 @@
+# -*- mode: python ; coding: utf-8 -*-
+# 命令列版（不含 GUI）：pyinstaller cli.spec
+# 排除 Tk / CustomTkinter，可在無顯示環境的主機執行，打包體積與啟動時間都比 GUI 版小
+
+block_cipher = None
+
+a = Analysis(
+    ['cli.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[
+        'faster_whisper',
+        'opencc',
+    ],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[
+        'tkinter',
+        '_tkinter',
+        'customtkinter',
+        'darkdetect',
+        'PIL',
+        'transcriber',
+    ],
+    win_no_prefer_redirects=False,
+    win_private_assemblies=False,
+    cipher=block_cipher,
+    noarchive=False,
+)
+
+pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+
+# 資料夾形式 (onedir)：單一執行檔 (onefile) 每次啟動都要先解壓縮到暫存資料夾
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='mp3-transcriber',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.zipfiles,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='mp3-transcriber-cli',
+)
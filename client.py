@@ -0,0 +1,143 @@
+"""工作伺服器 (server.py) 的用戶端，只使用標準函式庫
+
+用法:
+    python client.py 錄音.mp3 --priority 5 --wait
+    python client.py --status <id>
+    python client.py --cancel <id>
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from urllib.error import HTTPError
+from urllib.parse import quote, urlencode
+from urllib.request import Request, urlopen
+
+DEFAULT_SERVER_URL = os.environ.get("MP3_TRANSCRIBER_SERVER", "http://127.0.0.1:8765")
+
+FINISHED_STATES = ("done", "failed", "cancelled")
+
+
+class JobServerError(Exception):
+    """伺服器回傳錯誤"""
+
+
+class JobClient:
+    def __init__(self, base_url=DEFAULT_SERVER_URL, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None, headers=None):
+        request = Request(f"{self.base_url}{path}", data=body, method=method, headers=headers or {})
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                data = response.read()
+                content_type = response.headers.get("Content-Type", "")
+        except HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise JobServerError(f"{e.code}: {message}") from None
+        if content_type.startswith("application/json"):
+            return json.loads(data)
+        return data.decode("utf-8")
+
+    def is_available(self):
+        try:
+            self._request("GET", "/jobs")
+            return True
+        except (OSError, JobServerError):
+            return False
+
+    def submit(self, path, priority=0, model=None, vad=False, upload=False):
+        """送出工作並回傳工作 id；upload=True 時上傳音訊內容，否則只傳路徑（伺服器在同一台機器上）"""
+        options = {"priority": priority, "vad": vad}
+        if model:
+            options["model"] = model
+        if upload:
+            query = urlencode({**options, "name": os.path.basename(path)}, quote_via=quote)
+            with open(path, "rb") as f:
+                body = f.read()
+            response = self._request("POST", f"/jobs?{query}", body, {"Content-Type": "application/octet-stream"})
+        else:
+            body = json.dumps({**options, "path": os.path.abspath(path)}).encode("utf-8")
+            response = self._request("POST", "/jobs", body, {"Content-Type": "application/json"})
+        return response["id"]
+
+    def status(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def jobs(self):
+        return self._request("GET", "/jobs")["jobs"]
+
+    def result(self, job_id, fmt=None):
+        """fmt 為 None 時回傳 {"outputs", "contents"}，否則回傳該格式的文字內容"""
+        suffix = f"?format={fmt}" if fmt else ""
+        return self._request("GET", f"/jobs/{job_id}/result{suffix}")
+
+    def cancel(self, job_id):
+        return self._request("POST", f"/jobs/{job_id}/cancel", b"")
+
+    def wait(self, job_id, interval=1.0, on_update=None, should_cancel=None):
+        """輪詢直到工作結束，回傳最後的狀態"""
+        cancel_sent = False
+        while True:
+            status = self.status(job_id)
+            if on_update:
+                on_update(status)
+            if status["state"] in FINISHED_STATES:
+                return status
+            if should_cancel and should_cancel() and not cancel_sent:
+                try:
+                    self.cancel(job_id)
+                except JobServerError:
+                    pass  # 剛好結束
+                cancel_sent = True
+            time.sleep(interval)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="送出轉錄工作到工作伺服器")
+    parser.add_argument("inputs", nargs="*", help="音訊檔案")
+    parser.add_argument("--server", default=DEFAULT_SERVER_URL, help=f"伺服器位址 (預設: {DEFAULT_SERVER_URL})")
+    parser.add_argument("-p", "--priority", type=int, default=0, help="優先權，數字越大越先處理 (預設: 0)")
+    parser.add_argument("-m", "--model", default=None, help="Whisper 模型 (預設: 伺服器設定)")
+    parser.add_argument("--vad", action="store_true", help="略過靜音")
+    parser.add_argument("--upload", action="store_true", help="上傳音訊內容（伺服器無法直接讀取此路徑時使用）")
+    parser.add_argument("--wait", action="store_true", help="等待工作完成")
+    parser.add_argument("--status", metavar="ID", help="查詢工作狀態")
+    parser.add_argument("--cancel", metavar="ID", help="取消工作")
+    args = parser.parse_args(argv)
+
+    client = JobClient(args.server)
+    try:
+        if args.status:
+            print(json.dumps(client.status(args.status), ensure_ascii=False, indent=1))
+            return 0
+        if args.cancel:
+            client.cancel(args.cancel)
+            print(f"✓ 已要求取消 {args.cancel}")
+            return 0
+
+        job_ids = []
+        for path in args.inputs:
+            job_id = client.submit(path, args.priority, args.model, args.vad, args.upload)
+            job_ids.append(job_id)
+            print(f"✓ {os.path.basename(path)} -> {job_id}", flush=True)
+
+        failed = 0
+        if args.wait:
+            for job_id in job_ids:
+                status = client.wait(job_id)
+                print(f"{'✓' if status['state'] == 'done' else '✖'} {job_id}: {status['state']}", flush=True)
+                failed += status["state"] != "done"
+        return 1 if failed else 0
+    except (OSError, JobServerError) as e:
+        print(f"✖ {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
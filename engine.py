@@ -0,0 +1,553 @@
+"""轉錄核心引擎：不依賴任何 GUI，可供桌面程式與命令列共用"""
+import os
+import time
+import platform
+import itertools
+import threading
+from datetime import timedelta
+
+from audio_store import DEFAULT_MAX_BYTES as AUDIO_STORE_MAX_BYTES, AudioStore
+from autotune import get_tuned_config
+from cache import DEFAULT_MAX_BYTES, TranscriptionCache
+from checkpoint import JobManifest, ResumedInfo, shift_segments
+from chunking import SAMPLE_RATE, Word, transcribe_chunked
+from linebreak import DEFAULT_MAX_LINES, join_lines, retime
+from metrics import BatchMetrics, StageTimer
+from models import ModelRegistry
+from pipeline import DEFAULT_PREFETCH_DEPTH, DEFAULT_QUEUE_SIZE, AudioPrefetcher, background_iter
+from postprocess import SegmentPostProcessor
+from writers import DEFAULT_FORMATS, WRITERS, OutputSet, SubtitleEntry, assign_words, format_time
+
+# --- 設定 ---
+SUPPORTED_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.mp4')
+
+DEFAULT_INITIAL_PROMPT = "這是一段繁體中文的對話，請使用台灣地區的用詞。每個句子盡量保持簡短*最多只能有18個字，請在適當的地方斷句*，適合字幕顯示。"
+
+def get_device_config(log=print, model_name=None):
+    """根據作業系統自動選擇最佳裝置設定；若已用 autotune.py 調校過此模型則直接採用"""
+    if model_name:
+        try:
+            tuned = get_tuned_config(model_name)
+        except Exception:
+            tuned = None  # 調校檔損毀或無法偵測硬體時退回預設設定
+        if tuned:
+            log(f"✓ 使用自動調校設定: {tuned['device']} / {tuned['compute_type']}")
+            return tuned
+
+    system = platform.system()
+    machine = platform.machine()
+
+    if system == "Darwin":  # macOS
+        if machine == "arm64":  # Apple Silicon (M1/M2/M3/M4)
+            log("✓ 偵測到 Apple Silicon，使用 Metal GPU 加速")
+            return {
+                "device": "cpu",  # faster-whisper 在 macOS 上使用 "cpu" 但會利用 Metal
+                "compute_type": "int8",
+                "cpu_threads": 8,
+                "num_workers": 4
+            }
+        log("✓ 偵測到 Intel Mac，使用 CPU 運算")
+        return {
+            "device": "cpu",
+            "compute_type": "int8"
+        }
+
+    # Windows / Linux：無顯示環境的轉錄主機也要能執行
+    log("✓ 使用 CPU 運算")
+    return {
+        "device": "cpu",
+        "compute_type": "int8"
+    }
+
+
+def split_device_config(device_config, parts, num_workers=1):
+    """將 cpu_threads 平均分成 parts 份，避免多個轉錄同時執行時執行緒超額配置"""
+    config = dict(device_config)
+    if config.get("device", "cpu") == "cpu":
+        total_threads = config.get("cpu_threads") or os.cpu_count() or 1
+        config["cpu_threads"] = max(1, total_threads // parts)
+        config["num_workers"] = num_workers
+    return config
+
+
+def file_size(path):
+    """檔案大小 (bytes)；無法讀取時為 0"""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def collect_audio_files(paths, recursive=False):
+    """將檔案或資料夾路徑展開為支援格式的音訊檔清單"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            if recursive:
+                for root, dirs, names in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(names):
+                        if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                            files.append(os.path.join(root, name))
+            else:
+                for name in sorted(os.listdir(path)):
+                    full_path = os.path.join(path, name)
+                    if os.path.isfile(full_path) and name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        files.append(full_path)
+        else:
+            files.append(path)
+    return files
+
+
+def output_paths(file_path, formats=DEFAULT_FORMATS):
+    """回傳各輸出格式的檔案路徑（順序與 formats 相同）"""
+    base_name = os.path.splitext(file_path)[0]
+    return [f"{base_name}{WRITERS[name].suffix}" for name in formats]
+
+
+class TranscriptionEngine:
+    """批次轉錄引擎，整個批次共用同一個 WhisperModel（由 ModelRegistry 管理）"""
+
+    def __init__(self, model_name="medium", device_config=None, log=None,
+                 on_status=None, on_progress=None, beam_size=5, language="zh",
+                 initial_prompt=DEFAULT_INITIAL_PROMPT, chunk_length=0,
+                 chunk_overlap=5.0, chunk_workers=2, vad_filter=False,
+                 vad_parameters=None, cache_dir=None,
+                 cache_max_bytes=DEFAULT_MAX_BYTES, job_dir=None,
+                 output_formats=DEFAULT_FORMATS, models=None, metrics_log=None,
+                 metrics_file=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH,
+                 pipeline_queue_size=DEFAULT_QUEUE_SIZE, audio_store_dir=None,
+                 audio_store_max_bytes=AUDIO_STORE_MAX_BYTES, max_lines=DEFAULT_MAX_LINES,
+                 word_timestamps=False):
+        self.model_name = model_name
+        self.device_config = device_config
+        self.beam_size = beam_size
+        self.language = language
+        self.initial_prompt = initial_prompt
+        # 逐字時間（JSON 輸出的 words 欄位），推論時間會略為增加
+        self.word_timestamps = word_timestamps
+
+        # 長檔分段轉錄（chunk_length 為 0 表示關閉）
+        self.chunk_length = chunk_length
+        self.chunk_overlap = chunk_overlap
+        self.chunk_workers = chunk_workers
+
+        # 語音活動偵測：轉錄前先略過靜音與音樂段落
+        self.vad_filter = vad_filter
+        self.vad_parameters = vad_parameters
+
+        # 轉錄結果快取（cache_dir 為 None 表示關閉）
+        self.cache = TranscriptionCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+        # 解碼後音訊的共用儲存區（audio_store_dir 為 None 表示關閉）：每個檔案只解碼一次，
+        # 以 memmap 讀取，多個 worker 共用同一份分頁快取
+        self.audio_store = AudioStore(audio_store_dir, audio_store_max_bytes, decode=self._decode_file) if audio_store_dir else None
+
+        # 續跑用的工作清單與片段日誌（job_dir 為 None 表示關閉）
+        self.job = JobManifest(job_dir) if job_dir else None
+
+        self.output_formats = tuple(output_formats)
+        self.max_lines = max_lines  # 每個字幕區塊最多幾行（0 表示不限制）
+
+        # 分段計時：metrics_log 為 JSON 日誌行，metrics_file 為 Prometheus 文字檔（皆為選填）
+        self.metrics_log = metrics_log
+        self.metrics_file = metrics_file
+        self.metrics = BatchMetrics()
+        self.timer = StageTimer()
+        self.batch_sizes = []  # 批次中各檔案的大小，用來估算未處理檔案的音訊長度
+        self.resume_offset = 0.0
+
+        # 管線化：推論在背景執行緒，後處理與寫檔在呼叫端執行緒；批次中預先解碼下一個檔案
+        self.prefetch_depth = prefetch_depth
+        self.pipeline_queue_size = pipeline_queue_size
+        self.prefetcher = None
+        self.upcoming = []
+
+        # 回呼：GUI 或 CLI 各自決定如何顯示
+        self._log = log or print
+        self._on_status = on_status
+        self._on_progress = on_progress
+
+        self.cancel_event = threading.Event()  # 每個批次各自的取消旗標
+        self.start_time = None
+        self.file_stats = {}  # 最近一個檔案的統計資料
+
+        # 繁簡轉換與斷行（重複的文字直接取快取結果）
+        self.postprocessor = SegmentPostProcessor('s2twp')
+        # 已載入的模型由 registry 保存；切換模型時不必每次重新載入
+        self.models = models or ModelRegistry(log=self.log)
+        self.model = None  # 目前批次使用的模型
+        self.device_configs = {}  # 模型名稱 -> 實際使用的裝置設定
+
+    def log(self, message):
+        """輸出日誌訊息"""
+        self._log(message)
+
+    def update_status(self, text):
+        """更新狀態文字"""
+        if self._on_status:
+            self._on_status(text)
+
+    def update_progress(self, progress, time_text=None):
+        """更新進度 (0-1) 與時間資訊"""
+        if self._on_progress:
+            self._on_progress(progress, time_text)
+
+    def cancel(self):
+        """要求取消目前的批次"""
+        self.cancel_event.set()
+
+    @property
+    def cancel_flag(self):
+        return self.cancel_event.is_set()
+
+    @property
+    def cc(self):
+        """OpenCC 轉換器（第一次使用時才載入）"""
+        return self.postprocessor.cc
+
+    def resolve_device_config(self):
+        """決定目前模型實際使用的裝置設定（每個模型只偵測一次）"""
+        device_config = self.device_configs.get(self.model_name)
+        if device_config is None:
+            # 取得最佳裝置設定
+            device_config = self.device_config or get_device_config(self.log, self.model_name)
+            if self.chunk_length and self.chunk_workers > 1:
+                # 同一個模型同時轉錄多個區段：每個區段一個 CTranslate2 worker
+                device_config = split_device_config(device_config, self.chunk_workers, self.chunk_workers)
+            self.device_configs[self.model_name] = device_config
+        return device_config
+
+    def prewarm(self):
+        """在背景載入目前選擇的模型，第一個檔案開始時不必等待"""
+        return self.models.prewarm(self.model_name, self.resolve_device_config(), log=self.log)
+
+    def load_model(self):
+        """取得目前選擇的模型；已常駐時直接沿用，切換模型後自動改用新模型"""
+        device_config = self.resolve_device_config()
+        if not self.models.is_resident(self.model_name, device_config):
+            self.update_status(f"正在載入 Whisper 模型: {self.model_name}...")
+            self.log(f"\n正在載入模型 {self.model_name} (初次執行需下載模型，請稍候)...")
+            self.update_progress(0.05)
+
+        self.model = self.models.get(self.model_name, device_config, log=self.log)
+        return self.model
+
+    def process_batch(self, file_paths, cancel_event=None):
+        """處理多個檔案，回傳批次結果摘要
+
+        cancel_event 可由呼叫端保存並在任何時候 set()，只取消這一個批次
+        （即使在批次開始之前 set 也有效）。
+        """
+        self.cancel_event = cancel_event or threading.Event()
+        self.metrics = BatchMetrics(self.metrics_log, self.metrics_file)
+        self.batch_sizes = [file_size(path) for path in file_paths]
+        if not self.cache:
+            self.load_model()  # 啟用快取時延後到第一次未命中才載入
+
+        total_files = len(file_paths)
+        successful = 0
+        results = []
+
+        # 目前的檔案推論時，背景預先解碼接下來的檔案
+        if self.prefetch_depth:
+            self.prefetcher = AudioPrefetcher(self.decode, self.prefetch_depth)
+        try:
+            for idx, file_path in enumerate(file_paths):
+                if self.cancel_flag:
+                    self.log("\n✖ 批次處理已取消")
+                    break
+
+                self.log(f"\n{'='*60}")
+                self.log(f"處理檔案 {idx+1}/{total_files}: {os.path.basename(file_path)}")
+                self.log(f"{'='*60}")
+
+                if self.is_completed(file_path):
+                    self.log("↷ 先前已完成，略過")
+                    results.append({"file": file_path, "success": True, "elapsed": 0.0, "skipped": True})
+                    self.metrics.record(results[-1])
+                    successful += 1
+                    continue
+
+                # 取得目前檔案的音訊後才開始預先解碼這些檔案
+                self.upcoming = [p for p in file_paths[idx + 1:idx + 1 + self.prefetch_depth]
+                                 if not self.is_completed(p)]
+
+                file_start = time.time()
+                ok = self.process_single_file(file_path, total_files, idx)
+                if self.prefetcher:
+                    self.prefetcher.discard(file_path)  # 快取命中或失敗時沒有取用
+                results.append({
+                    "file": file_path,
+                    "success": ok,
+                    "elapsed": time.time() - file_start,
+                    **self.file_stats,
+                })
+                self.metrics.record(results[-1])
+                if ok:
+                    successful += 1
+                    if self.job:
+                        self.job.mark_done(file_path)
+        finally:
+            if self.prefetcher:
+                self.prefetcher.close()
+                self.prefetcher = None
+
+        if not self.cancel_flag:
+            self.update_progress(1.0, "")
+            self.update_status("全部完成！")
+            self.log(f"\n{'='*60}")
+            self.log(f"✓ 批次處理完成！成功: {successful}/{total_files}")
+            if self.vad_filter:
+                skipped = sum(r.get("vad_skipped", 0) for r in results)
+                self.log(f"  VAD 共略過 {skipped:.1f} 秒非語音")
+            if self.cache:
+                self.log(f"  {self.cache.stats_report()}")
+            if self.audio_store:
+                self.log(f"  {self.audio_store.stats_report()}")
+            if self.metrics.rtf:
+                self.log(f"  處理速度: {self.metrics.rtf:.2f}x 即時 (處理時間 / 音訊長度)")
+            self.log(f"  階段耗時: {self.metrics.stage_report()}")
+            self.log(f"  {self.postprocessor.stats_report()}")
+            self.log(f"{'='*60}")
+        self.metrics.finish({"postprocess_cache": self.postprocessor.stats()})
+
+        return {
+            "successful": successful,
+            "total": total_files,
+            "cancelled": self.cancel_flag,
+            "files": results,
+        }
+
+    def process_single_file(self, file_path, total_files=1, file_idx=0):
+        """處理單一檔案"""
+        self.file_stats = {"bytes": file_size(file_path)}
+        self.timer = StageTimer()
+        try:
+            # 檢查檔案是否存在
+            if not os.path.exists(file_path):
+                self.log(f"✖ 檔案不存在: {file_path}")
+                return False
+
+            self.start_time = time.time()
+
+            self.update_status(f"轉錄中 ({file_idx+1}/{total_files}): {os.path.basename(file_path)}")
+
+            # 從片段日誌接續上次中斷的位置
+            journal = self.job.journal(file_path, self.cache_settings(self.transcribe_options())) if self.job else None
+            resumed = journal.load() if journal else []
+            offset = resumed[-1].end if resumed else 0.0
+            self.resume_offset = offset
+            if resumed:
+                self.log(f"↻ 從 {format_time(offset)} 繼續（已完成 {len(resumed)} 段）")
+
+            # 執行轉錄
+            segments, info = self.transcribe(file_path, offset)
+            segments = self.timer.timed("inference", segments)
+            if journal:
+                segments = itertools.chain(resumed, journal.record(segments))
+            # 推論在背景執行緒進行，這個執行緒同時做後處理與寫檔
+            segments = background_iter(segments, self.pipeline_queue_size, name="inference")
+
+            segment_id = 1
+            total_duration = info.duration if info.duration > 0 else 1
+
+            # 每個片段完成就寫入 .part 暫存檔，全部完成後才改名
+            outputs = OutputSet(file_path, self.output_formats)
+            try:
+                # 處理每個片段
+                for segment in segments:
+                    # 檢查取消
+                    if self.cancel_flag:
+                        self.log("✖ 處理已取消")
+                        outputs.abort()
+                        return False
+
+                    self.report_progress(segment.end, total_duration, total_files, file_idx)
+
+                    # 繁簡轉換
+                    with self.timer.stage("opencc"):
+                        converted = self.postprocessor.convert(segment.text)
+                        words = [
+                            Word(word.start, word.end, self.postprocessor.convert(word.word), word.probability)
+                            for word in getattr(segment, "words", None) or ()
+                        ]
+
+                    # 全形標點 + 斷行
+                    with self.timer.stage("split"):
+                        text_lines, srt_lines, clean_text = self.postprocessor.format(converted)
+
+                    # 超過 max_lines 行的片段拆成多個字幕區塊，時間依字數比例分配
+                    blocks = retime(segment.start, segment.end, srt_lines, self.max_lines)
+                    with self.timer.stage("write"):
+                        for (start, end, lines), block_words in zip(blocks, assign_words(words, blocks)):
+                            text = clean_text if len(blocks) == 1 else join_lines(lines)
+                            outputs.write(SubtitleEntry(segment_id, start, end, lines, text, block_words))
+                            segment_id += 1
+
+                    # 輸出到日誌（顯示所有內容）
+                    start_time = format_time(segment.start)
+                    if len(text_lines) > 1:
+                        self.log(f"[{start_time}] (共{len(text_lines)}行)")
+                        for idx, line in enumerate(text_lines, 1):
+                            self.log(f"  第{idx}行: {line}")
+                    else:
+                        self.log(f"[{start_time}] {text_lines[0] if text_lines else clean_text}")
+            except BaseException:
+                outputs.abort()
+                raise
+            finally:
+                segments.close()  # 提前結束時通知背景執行緒停止
+
+            self.file_stats["duration"] = info.duration
+            self.file_stats["transcribed"] = max(0.0, info.duration - offset)
+            self.file_stats["segments"] = segment_id - 1
+            if self.vad_filter:
+                # 需在片段全部取出後讀取：分段模式的數值會隨區段完成而累加
+                skipped = max(0.0, info.duration - getattr(info, "duration_after_vad", info.duration))
+                self.file_stats["vad_skipped"] = skipped
+                self.log(f"✓ VAD 略過 {skipped:.1f} 秒非語音 (共 {info.duration:.1f} 秒)")
+
+            # 儲存檔案
+            with self.timer.stage("write"):
+                outputs.commit()
+            self.file_stats["stages"] = self.timer.as_dict()
+            self.file_stats["outputs"] = outputs.paths
+            for path in outputs.paths:
+                self.log(f"✓ 已儲存: {os.path.basename(path)}")
+
+            if journal:
+                journal.discard()
+            return True
+
+        except Exception as e:
+            self.log(f"✖ 處理失敗: {str(e)}")
+            return False
+
+    def is_completed(self, file_path):
+        """工作清單記錄已完成且輸出檔仍存在"""
+        return bool(self.job) and self.job.is_done(file_path) and all(
+            os.path.exists(path) for path in output_paths(file_path, self.output_formats)
+        )
+
+    def transcribe_options(self):
+        """傳給 model.transcribe 的解碼設定"""
+        options = dict(
+            beam_size=self.beam_size,
+            language=self.language,
+            initial_prompt=self.initial_prompt
+        )
+        if self.word_timestamps:
+            options["word_timestamps"] = True
+        if self.vad_filter:
+            # 時間戳記由 faster-whisper 對回原始時間軸，字幕時間不會偏移
+            options["vad_filter"] = True
+            if self.vad_parameters:
+                options["vad_parameters"] = dict(self.vad_parameters)
+        return options
+
+    def transcribe(self, file_path, offset=0.0):
+        """執行轉錄，回傳 (片段產生器, info)；offset 大於 0 時從該秒數開始轉錄"""
+        options = self.transcribe_options()
+
+        key = None
+        if self.cache and not offset:
+            key = self.cache.make_key(file_path, self.cache_settings(options))
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.file_stats["cache"] = "hit"
+                self.log("✓ 快取命中，略過轉錄")
+                segments, info = cached
+                return iter(segments), info
+            self.file_stats["cache"] = "miss"
+
+        self.load_model()
+
+        # 自行解碼（與 faster-whisper 內部相同的 16 kHz 單聲道），解碼時間才能單獨計算；
+        # 已在背景預先解碼時只計入等待的時間
+        with self.timer.stage("decode"):
+            audio = self.prefetcher.take(file_path) if self.prefetcher else None
+            if audio is None:
+                audio = self.decode(file_path)
+        if self.prefetcher:
+            for path in self.upcoming:
+                self.prefetcher.schedule(path)
+        if offset:
+            audio = audio[int(offset * SAMPLE_RATE):]
+
+        # transcribe() 呼叫本身會先計算特徵、VAD 與語言偵測，計入推論時間（不計次數）
+        inference_start = time.perf_counter()
+        if self.chunk_length:
+            segments, info = transcribe_chunked(
+                self.model,
+                audio,
+                chunk_length=self.chunk_length,
+                overlap=self.chunk_overlap,
+                workers=self.chunk_workers,
+                **options
+            )
+        else:
+            segments, info = self.model.transcribe(audio, **options)
+        self.timer.add("inference", time.perf_counter() - inference_start, 0)
+
+        if offset:
+            return shift_segments(segments, offset), ResumedInfo(info, offset)
+        if key is not None:
+            segments = self.cache.record(key, segments, info)
+        return segments, info
+
+    def decode(self, file_path):
+        """解碼為 16 kHz 單聲道 float32；啟用音訊儲存區時回傳唯讀 memmap（分段與續跑的切片皆不複製）"""
+        if self.audio_store:
+            return self.audio_store.load(file_path)
+        return self._decode_file(file_path)
+
+    @staticmethod
+    def _decode_file(file_path):
+        from faster_whisper import decode_audio
+        return decode_audio(file_path, sampling_rate=SAMPLE_RATE)
+
+    def cache_settings(self, options):
+        """會影響轉錄結果的設定，作為快取鍵的一部分"""
+        return {
+            "model": self.model_name,
+            "compute_type": self.resolve_device_config().get("compute_type"),
+            # 分段轉錄的縫合結果與整段轉錄不同，也要納入
+            "chunk": [self.chunk_length, self.chunk_overlap] if self.chunk_length else None,
+            **options,
+        }
+
+    def report_progress(self, position, total_duration, total_files, file_idx):
+        """計算總進度（考慮批次）與預估剩餘時間"""
+        batch_base_progress = file_idx / total_files
+        file_progress = (position / total_duration) / total_files
+
+        # 限制在 0-1 之間
+        total_progress = max(0.05, min(0.95, batch_base_progress + file_progress))
+
+        time_text = None
+        elapsed_time = time.time() - self.start_time
+        progress_ratio = position / total_duration
+
+        # 至少處理 5% 再估算；快取命中的檔案不代表轉錄速度
+        if progress_ratio > 0.05 and self.file_stats.get("cache") != "hit":
+            # 整個批次實測的 realtime factor：已完成檔案加上目前檔案已處理的部分
+            processed_audio = self.metrics.audio_seconds + max(position - self.resume_offset, 1e-3)
+            rtf = (self.metrics.wall_seconds + elapsed_time) / processed_audio
+
+            # 剩餘音訊：目前檔案的剩餘部分，加上未處理檔案依大小換算的長度
+            remaining_audio = total_duration - position
+            remaining_bytes = sum(self.batch_sizes[file_idx + 1:])
+            if remaining_bytes:
+                current_bytes = self.batch_sizes[file_idx] if file_idx < len(self.batch_sizes) else 0
+                bytes_per_second = (self.metrics.audio_bytes + current_bytes) / (self.metrics.audio_seconds + total_duration)
+                if bytes_per_second > 0:
+                    remaining_audio += remaining_bytes / bytes_per_second
+            total_remaining = rtf * remaining_audio
+
+            elapsed_str = str(timedelta(seconds=int(elapsed_time)))
+            remaining_str = str(timedelta(seconds=int(total_remaining)))
+
+            time_text = f"已用: {elapsed_str} | 預估剩餘: {remaining_str}"
+
+        self.update_progress(total_progress, time_text)
@@ -1,168 +1,253 @@
 import re
 import os
+import sys
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def format_subtitles(input_file, output_file):
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    # Split into blocks
-    blocks = content.strip().split('\n\n')
-    formatted_blocks = []
-
-    # Replacements map
-    replacements = {
-        '能夠': '能',
-        '想要': '想',
-        '上面': '上',
-        '需要': '要',
-        '大家': '你',
-        '但是': '但',
-        '哈哈哈': 'XDD',
-        '還是': '或是',
-        '不想要': '不想',
-        '很需要': '需要',
-        # '個': '一個', # This might be risky if it's already "一個". Regex better.
-        '防': '預防',
-        '東西': '產品',
-        '覺得說': '覺得',
-        '比如說': '比如',
-        '我自己': '自己',
-        '這件事情': '這件事',
-        '大廠': '大品牌',
-        '過程當中': '過程中',
-        '情況之下': '情況下',
-        '一件事情': '一件事',
-        '大概': '大致上',
-        '想像的那麼快': '想像地快',
-        '沒有辦法': '無法',
-        '底層': '底層的邏輯'
-    }
-
-    # Filler words to remove (careful with these)
-    fillers = ['那', '欸', '對吧', '嘛', '然後', '哦', '就是', '那當然']
-
-    for block in blocks:
-        lines = block.split('\n')
-        if len(lines) < 3:
-            formatted_blocks.append(block)
-            continue
+from linebreak import DEFAULT_MAX_LINES, MAX_LINE_LENGTH, break_lines, retime
+from rules import RuleSet, load_rules
+from srt_io import SrtBlock, SrtStreamWriter, iter_srt_file
+
+WRITE_BUFFER = 1024 * 1024
+
+AI_PATTERN = re.compile(r'AI|LLM|GPT|MODEL|模型', re.IGNORECASE)
+IT_PRONOUN_TABLE = str.maketrans({'他': '它', '她': '它'})
+ORDINAL_PATTERN = re.compile(r'(第\d+個)')
+
+
+def format_text(full_text, normalizer):
+    """Restyle one block's text (lines already joined); returns the new lines"""
+    # 1. Basic Replacements (longest match first, single pass)
+    full_text = normalizer.apply_replacements(full_text)
+
+    # "個" -> "一個" is skipped: "三個" -> "三一個" would be wrong.
+
+    # 2. Remove Fillers (at sentence start or next to a comma)
+    full_text = normalizer.remove_fillers(full_text)
+
+    # 3. AI/Human "它"
+    if AI_PATTERN.search(full_text):
+        full_text = full_text.translate(IT_PRONOUN_TABLE)
+
+    # 4. Spacing (Zh/En)
+    full_text = normalizer.space_cjk_latin(full_text)
+
+    # 5. Punctuation
+    # Rule 7: Add full-width comma for specific words
+    full_text = normalizer.add_trigger_commas(full_text)
+
+    # Regex for "第N個"
+    full_text = ORDINAL_PATTERN.sub(r'\1，', full_text)
 
-        # Extract text lines (usually line 3 onwards)
-        # SRT format:
-        # 1
-        # 00:00:00,000 --> 00:00:05,000
-        # Text line 1
-        # Text line 2
-        
-        index = lines[0]
-        timestamp = lines[1]
-        text_lines = lines[2:]
-        
-        full_text = "".join(text_lines) # Join lines to process as one sentence
-        
-        # 1. Basic Replacements
-        for old, new in replacements.items():
-            full_text = full_text.replace(old, new)
-            
-        # Handle "個" -> "一個" separately to avoid "一個" -> "一一個"
-        # If "個" is preceded by a number or "這/那", maybe don't change?
-        # User said "個" -> "一個". Let's assume standalone "個".
-        # full_text = re.sub(r'(?<!一)個', '一個', full_text) # Simple heuristic
-        # Actually, "三個" -> "三一個" is wrong. "這個" -> "這一個".
-        # Let's skip this one if it's risky, or apply carefully.
-        # "個" is a measure word. "一個" is "one [measure]".
-        # If user wants "個" -> "一個", maybe they mean "有個..." -> "有一個...".
-        # I'll skip it to be safe or only apply if not preceded by number.
-        
-        # 2. Remove Fillers
-        for filler in fillers:
-            # Remove filler if it's at start or followed by comma
-            # Or just remove them? "Remove redundant...".
-            # "然後" is structural. Removing it might break meaning.
-            # I will remove them if they are at the start of the sentence.
-            if full_text.startswith(filler):
-                full_text = full_text[len(filler):]
-            # Also remove "就是" inside?
-            full_text = full_text.replace(f'{filler}，', '')
-            full_text = full_text.replace(f'，{filler}', '')
-        
-        # 3. AI/Human "它"
-        if any(x in full_text.upper() for x in ['AI', 'LLM', 'GPT', 'MODEL', '模型']):
-            full_text = full_text.replace('他', '它').replace('她', '它')
-
-        # 4. Spacing (Zh/En)
-        # Add space between Zh and En/Num
-        full_text = re.sub(r'([\u4e00-\u9fff])([a-zA-Z0-9])', r'\1 \2', full_text)
-        full_text = re.sub(r'([a-zA-Z0-9])([\u4e00-\u9fff])', r'\1 \2', full_text)
-        
-        # 5. Punctuation
-        # Rule 7: Add full-width comma for specific words
-        triggers = ['請問', '假設', '比如', '他說', '另外', '那一天', '我認為']
-        for trigger in triggers:
-            if full_text.startswith(trigger) and not full_text.startswith(f"{trigger}，"):
-                 full_text = full_text.replace(trigger, f"{trigger}，", 1)
-        
-        # Regex for "第N個"
-        full_text = re.sub(r'(第\d+個)', r'\1，', full_text)
-
-        # Rule 1: Remove all punctuation (at end?)
-        # User says "Remove all punctuation marks" but also "Use full-width punctuation".
-        # And "Add space...".
-        # I will replace standard punctuation with full-width or space.
-        # If I remove all, I lose structure.
-        # Let's assume: Internal punctuation -> Full width. End of line -> Removed.
-        
-        # Convert common punctuation to full-width
-        full_text = full_text.replace(',', '，').replace('.', '。').replace('?', '？').replace('!', '！')
-        
-        # Remove trailing punctuation
-        if full_text and full_text[-1] in '，。？！':
-            full_text = full_text[:-1]
-
-        # 6. Line Length (Max 18 chars)
-        # If > 18 chars, split.
-        # Try to split at punctuation or space.
-        
-        new_lines = []
-        while len(full_text) > 18:
-            # Find split point
-            # Prefer split at '，' or ' '
-            split_idx = -1
-            
-            # Look for punctuation in the first 18 chars (or slightly more?)
-            # No, strictly max 18.
-            chunk = full_text[:18]
-            
-            # Check for punctuation to split *after*
-            puncs = ['，', '。', '？', '！', ' ']
-            last_punc = -1
-            for p in puncs:
-                idx = chunk.rfind(p)
-                if idx > last_punc:
-                    last_punc = idx
-            
-            if last_punc > 5: # Don't split too early
-                split_idx = last_punc + 1 # Include punctuation in first line? Or remove?
-                # Usually keep punctuation attached to first part.
-                new_lines.append(full_text[:split_idx])
-                full_text = full_text[split_idx:].strip()
+    # Rule 1: Remove all punctuation (at end?)
+    # User says "Remove all punctuation marks" but also "Use full-width punctuation".
+    # And "Add space...".
+    # I will replace standard punctuation with full-width or space.
+    # If I remove all, I lose structure.
+    # Let's assume: Internal punctuation -> Full width. End of line -> Removed.
+    
+    # Convert common punctuation to full-width
+    full_text = normalizer.widen_punctuation(full_text)
+    
+    # Remove trailing punctuation
+    if full_text and full_text[-1] in '，。？！':
+        full_text = full_text[:-1]
+
+    # 6. Line Length (Max 18 chars)
+    # Optimal breaks over the whole block (punctuation, spaces and CJK/Latin
+    # boundaries preferred, lines kept balanced), punctuation stays on the
+    # first line.
+    return list(break_lines(full_text, MAX_LINE_LENGTH))
+
+
+def format_subtitles(input_file, output_file, rules=None, max_lines=DEFAULT_MAX_LINES, stats=None):
+    # Replacements, fillers, triggers and punctuation come from a rule pack
+    # (rules/default.json unless given); compiled once and reused per mtime
+    if not isinstance(rules, RuleSet):
+        rules = load_rules(rules)
+    normalizer = rules.normalizer
+
+    # Stream block by block so memory stays flat on multi-GB dumps. Write to a
+    # temp file and rename on success: a half-written output would otherwise
+    # look up to date and be skipped by every later batch run
+    tmp_path = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8', buffering=WRITE_BUFFER) as f:
+            writer = SrtStreamWriter(f)
+            added = 0  # extra blocks from re-timing; later blocks are renumbered after them
+            # Blocks without a timestamp line are dropped; stats['malformed'] counts them
+            for block in iter_srt_file(input_file, stats):
+                # Join lines to process as one sentence
+                new_lines = format_text("".join(block.lines), normalizer)
+                # Blocks over max_lines are split, time shared out by character count
+                parts = retime(block.start_ms, block.end_ms, new_lines, max_lines)
+                for n, (start_ms, end_ms, lines) in enumerate(parts):
+                    writer.write(SrtBlock(block.index + added + n, start_ms, end_ms, lines))
+                added += len(parts) - 1
+        os.replace(tmp_path, output_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return writer.count
+
+
+def expand_inputs(patterns, recursive=False):
+    """Expand files, directories and glob patterns into sorted (file, root) pairs.
+
+    root is the directory the file was found under, so outputs can mirror
+    the input tree; it is None for plain file arguments.
+    """
+    found = {}
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            if recursive:
+                for dirpath, dirnames, filenames in os.walk(pattern):
+                    dirnames.sort()
+                    for name in filenames:
+                        if name.lower().endswith('.srt'):
+                            found.setdefault(os.path.join(dirpath, name), pattern)
             else:
-                # Force split at 18
-                new_lines.append(full_text[:18])
-                full_text = full_text[18:].strip()
-        
-        if full_text:
-            new_lines.append(full_text)
-            
-        # Reconstruct block
-        new_block = f"{index}\n{timestamp}\n" + "\n".join(new_lines)
-        formatted_blocks.append(new_block)
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write('\n\n'.join(formatted_blocks))
+                for name in sorted(os.listdir(pattern)):
+                    path = os.path.join(pattern, name)
+                    if name.lower().endswith('.srt') and os.path.isfile(path):
+                        found.setdefault(path, pattern)
+            continue
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path):
+                found.setdefault(path, None)
+    return sorted(found.items())
+
+
+def output_path_for(input_file, output, suffix, root=None):
+    """Where the formatted copy of input_file goes"""
+    base, ext = os.path.splitext(os.path.basename(input_file))
+    name = f"{base}{suffix}{ext}"
+    if output is None:
+        return os.path.join(os.path.dirname(input_file), name)
+    if os.path.isdir(output) or root is not None:
+        # Mirror the input tree below the output directory
+        subdir = os.path.relpath(os.path.dirname(input_file), root) if root else ''
+        return os.path.normpath(os.path.join(output, subdir, name))
+    return output
+
+
+def is_up_to_date(input_file, output_file, rules):
+    """Output exists and is newer than both its input and the rule pack"""
+    try:
+        output_mtime = os.path.getmtime(output_file)
+        return output_mtime >= max(os.path.getmtime(input_file), rules.mtime)
+    except OSError:
+        return False
+
+
+_worker_rules = None
+_worker_max_lines = DEFAULT_MAX_LINES
+
+
+def _init_worker(rules_path, max_lines=DEFAULT_MAX_LINES):
+    global _worker_rules, _worker_max_lines
+    _worker_rules = load_rules(rules_path)
+    _worker_max_lines = max_lines
+
+
+def _format_job(job):
+    """Format one file in a worker; returns (input, output, blocks, bytes, malformed)"""
+    input_file, output_file = job
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    read_stats = {}
+    blocks = format_subtitles(input_file, output_file, _worker_rules, _worker_max_lines, read_stats)
+    return input_file, output_file, blocks, os.path.getsize(input_file), read_stats["malformed"]
+
+
+def format_batch(jobs, rules_path=None, workers=1, log=print, max_lines=DEFAULT_MAX_LINES):
+    """Format (input, output) pairs, across a process pool when workers > 1"""
+    stats = {"files": 0, "blocks": 0, "bytes": 0, "failed": 0, "malformed": 0}
+    start = time.time()
+
+    def record(job, run):
+        try:
+            _, _, blocks, size, malformed = run()
+        except Exception as e:
+            stats["failed"] += 1
+            log(f"Failed: {job[0]}: {e}")
+            return
+        if malformed:
+            log(f"Skipped {malformed} block(s) without a timestamp in {job[0]}")
+        stats["files"] += 1
+        stats["blocks"] += blocks
+        stats["bytes"] += size
+        stats["malformed"] += malformed
+
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_path, max_lines)) as executor:
+            futures = {executor.submit(_format_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                record(futures[future], future.result)
+    else:
+        _init_worker(rules_path, max_lines)
+        for job in jobs:
+            record(job, lambda: _format_job(job))
+
+    stats["seconds"] = time.time() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Restyle SRT subtitles with a rule pack")
+    parser.add_argument("inputs", nargs="+", help="input files, directories or glob patterns (e.g. 'subs/**/*.srt')")
+    parser.add_argument("-o", "--output", default=None, help="output file (single input) or directory")
+    parser.add_argument("-r", "--rules", default=None, help="rule pack JSON (default: rules/default.json)")
+    parser.add_argument("--suffix", default="_formatted", help="suffix added to output names (default: _formatted)")
+    parser.add_argument("-R", "--recursive", action="store_true", help="walk directory inputs recursively")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes (default: 1, 0 = all cores)")
+    parser.add_argument("--max-lines", type=int, default=DEFAULT_MAX_LINES,
+                        help=f"split blocks longer than this many lines, re-timed by character count (default: {DEFAULT_MAX_LINES}, 0 = off)")
+    parser.add_argument("-f", "--force", action="store_true",
+                        help="reformat even if the output is up to date (always the case with a non-default --max-lines)")
+    args = parser.parse_args(argv)
+
+    # Never feed our own outputs back in as inputs
+    inputs = [(path, root) for path, root in expand_inputs(args.inputs, args.recursive)
+              if not os.path.splitext(path)[0].endswith(args.suffix)]
+    if not inputs:
+        print("No input files matched", file=sys.stderr)
+        return 1
+    if len(inputs) > 1 and args.output and not os.path.isdir(args.output) and os.path.exists(args.output):
+        print("--output must be a directory when formatting several files", file=sys.stderr)
+        return 1
+
+    rules = load_rules(args.rules)
+    output = args.output
+    if len(inputs) > 1 and output:
+        os.makedirs(output, exist_ok=True)
+
+    # Outputs don't record the --max-lines they were made with, so the
+    # up-to-date shortcut is only trusted at the default
+    check_fresh = not args.force and args.max_lines == DEFAULT_MAX_LINES
+    jobs = []
+    skipped = 0
+    for input_file, root in inputs:
+        output_file = output_path_for(input_file, output, args.suffix, root)
+        if check_fresh and is_up_to_date(input_file, output_file, rules):
+            skipped += 1
+            continue
+        jobs.append((input_file, output_file))
+
+    workers = args.jobs or os.cpu_count() or 1
+    stats = format_batch(jobs, rules.path, workers, max_lines=args.max_lines)
+
+    seconds = stats["seconds"] or 1e-9
+    print(f"Formatted {stats['files']} file(s), skipped {skipped} up to date, {stats['failed']} failed"
+          + (f", {stats['malformed']} malformed block(s) dropped" if stats['malformed'] else ""))
+    print(f"{stats['blocks']} blocks, {stats['bytes'] / 1024 / 1024:.1f} MB in {stats['seconds']:.2f}s "
+          f"({stats['blocks'] / seconds:,.0f} blocks/sec, {stats['bytes'] / 1024 / 1024 / seconds:.1f} MB/sec)")
+    return 1 if stats["failed"] else 0
+
 
 if __name__ == "__main__":
-    input_path = r"d:\yan\mp3_to_text\11月24日_cht_1.txt"
-    output_path = r"d:\yan\mp3_to_text\11月24日_cht_formatted.txt"
-    format_subtitles(input_path, output_path)
-    print(f"Formatted file saved to {output_path}")
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""字幕斷行：以動態規劃在所有候選斷點中找出整體最佳的分行
+
+轉錄端 (postprocess) 與格式化端 (format_subtitles) 共用。每行最多 max_length 字；
+斷點成本依位置而定（標點、空白之後最低，中英文交界與虛詞前後次之，其他中文字之間較高，
+英文單字或數字中間最高），每一行再依與上限的差距計算成本，讓各行長度平均。
+每個位置只往回看 max_length 個候選起點，整體為線性時間。
+
+超過 max_lines 行的區塊以 retime 拆成多個區塊，時間依字數比例分配。
+"""
+import re
+from operator import add
+
+MAX_LINE_LENGTH = 18
+DEFAULT_MAX_LINES = 2
+
+# 在這些字元之後斷行成本最低；keep_punctuation=False 時行尾的這些標點會被移除
+BREAK_PUNCTUATION = '，。？！；：、,.!?;:'
+# 不應出現在行首的標點（斷在它們前面會讓標點落到下一行開頭）
+NO_LINE_START = BREAK_PUNCTUATION + '）」』】〉》…～'
+# 不應出現在行尾的標點
+NO_LINE_END = '（「『【〈《'
+
+# 沒有斷詞時的近似：虛詞前後通常是詞的邊界
+BREAK_BEFORE_WORDS = '的是在和跟與把就也都但或被讓給對從而'
+BREAK_AFTER_WORDS = '了嗎呢吧啊著過的'
+
+# 斷點成本
+COST_AFTER_PUNCTUATION = 0
+COST_AT_SPACE = 0
+COST_CJK_LATIN = 10
+COST_AT_PARTICLE = 15
+COST_BETWEEN_CJK = 30
+COST_BAD_PUNCTUATION = 500
+COST_INSIDE_WORD = 1000
+
+# 每多一行的成本（避免不必要的分行）與過短行的成本
+COST_PER_LINE = 50
+COST_SHORT_LINE = 200
+MIN_LINE_LENGTH = 4
+
+INF = float("inf")
+
+
+_LATIN_RUN = re.compile(r'[A-Za-z0-9]+')
+_SPACE = re.compile(r'\s')
+_BREAK_AFTER = re.compile(f'[{re.escape(BREAK_PUNCTUATION)}]')
+_NO_BREAK_BEFORE = re.compile(f'[\\s{re.escape(NO_LINE_START)}]')
+_NO_BREAK_AFTER = re.compile(f'[{re.escape(NO_LINE_END)}]')
+_PARTICLE_BEFORE = re.compile(f'[{BREAK_BEFORE_WORDS}]')
+_PARTICLE_AFTER = re.compile(f'[{BREAK_AFTER_WORDS}]')
+
+
+def _is_latin(char):
+    return char.isascii() and char.isalnum()
+
+
+def break_costs(text):
+    """每個位置 i（text[i-1] 與 text[i] 之間）的斷行成本；costs[0] 不使用
+
+    預設為中文字之間的成本，只有特殊字元（英數字、標點、空白）附近的位置需要修改；
+    依優先順序由低到高套用，後面的規則覆蓋前面的。
+    """
+    n = len(text)
+    costs = [COST_BETWEEN_CJK] * n
+    for m in _PARTICLE_BEFORE.finditer(text, 1):
+        costs[m.start()] = COST_AT_PARTICLE
+    for m in _PARTICLE_AFTER.finditer(text, 0, n - 1):
+        costs[m.end()] = COST_AT_PARTICLE
+    for m in _LATIN_RUN.finditer(text):
+        start, end = m.span()
+        costs[start + 1:end] = [COST_INSIDE_WORD] * (end - start - 1)
+        if start > 0:
+            costs[start] = COST_CJK_LATIN
+        if end < n:
+            costs[end] = COST_CJK_LATIN
+    for m in _BREAK_AFTER.finditer(text, 0, n - 1):
+        costs[m.end()] = COST_AFTER_PUNCTUATION
+    for m in _NO_BREAK_BEFORE.finditer(text, 1):
+        costs[m.start()] = COST_BAD_PUNCTUATION
+    for m in _NO_BREAK_AFTER.finditer(text, 0, n - 1):
+        costs[m.end()] = COST_BAD_PUNCTUATION
+    for m in _SPACE.finditer(text, 0, n - 1):
+        costs[m.end()] = COST_AT_SPACE
+    return costs
+
+
+def break_lines(text, max_length=MAX_LINE_LENGTH, keep_punctuation=True):
+    """將 text 分成每行最多 max_length 字的字幕行，回傳 tuple
+
+    keep_punctuation=False 時，斷點處的行尾標點移除（轉錄端的 SRT 風格）。
+    行首行尾的空白一律移除。
+    """
+    text = text.strip()
+    n = len(text)
+    if n <= max_length:
+        return (text,) if text else ()
+
+    costs = break_costs(text)
+    costs.append(0)  # 文字結尾不是斷點
+    # 斷在空白之後（行首不會是空白）；行尾的空白與不保留的標點不計入長度
+    strip_punctuation = "" if keep_punctuation else BREAK_PUNCTUATION
+    trailing = [0] + [1 if char.isspace() or char in strip_punctuation else 0 for char in text[:-1]] + [0]
+
+    # 各行長度的成本（與上限的差距平方，過短的行另加成本），長度 0 與超過上限為無限大；
+    # 反向存放，候選起點由左到右時對應連續的一段，整列一次相加
+    line_costs = [INF] * (max_length + 2)
+    for length in range(1, max_length + 1):
+        slack = max_length - length
+        line_costs[length] = slack * slack + (COST_SHORT_LINE if length < MIN_LINE_LENGTH else 0)
+    reversed_costs = line_costs[::-1]
+    top = len(line_costs) - 1
+
+    # best[j]: text[:j] 分行的最低成本；previous[j]: 最後一行的起點
+    best = [0] * (n + 1)
+    previous = [0] * (n + 1)
+    for j in range(1, n + 1):
+        end = j - trailing[j]
+        lowest = max(0, end - top)
+        # 起點 i 的行長為 end - i，對應 reversed_costs[top - end + i]
+        candidates = list(map(add, best[lowest:j], reversed_costs[top - end + lowest:top - end + j]))
+        best_cost = min(candidates)
+        if best_cost == INF:
+            # 只有連續多個空白時才會發生：併入前一個位置（重建時空行會被略過）
+            best[j], previous[j] = best[j - 1], j - 1
+            continue
+        best[j] = best_cost + COST_PER_LINE + costs[j]
+        previous[j] = lowest + candidates.index(best_cost)
+
+    bounds = []
+    j = n
+    while j > 0:
+        bounds.append((previous[j], j))
+        j = previous[j]
+
+    lines = []
+    for i, j in reversed(bounds):
+        line = text[i:j].strip()
+        if not keep_punctuation and j < n:
+            line = line.rstrip(BREAK_PUNCTUATION)
+        if line:
+            lines.append(line)
+    return tuple(lines)
+
+
+def join_lines(lines):
+    """把字幕行接回單行文字；兩側都是英數字時補回斷行時移除的空白"""
+    text = ""
+    for line in lines:
+        if text and _is_latin(text[-1]) and _is_latin(line[0]):
+            text += " "
+        text += line
+    return text
+
+
+def retime(start, end, lines, max_lines=DEFAULT_MAX_LINES):
+    """超過 max_lines 行時拆成多個區塊，時間依字數比例分配；回傳 [(start, end, lines)]
+
+    start / end 為整數（毫秒）時分配結果也取整數。max_lines 為 0 表示不限制。
+    """
+    lines = tuple(lines)
+    if not max_lines or len(lines) <= max_lines:
+        return [(start, end, lines)]
+
+    groups = [lines[k:k + max_lines] for k in range(0, len(lines), max_lines)]
+    total = sum(len(line) for line in lines) or 1
+    blocks = []
+    done = 0
+    block_start = start
+    for idx, group in enumerate(groups):
+        done += sum(len(line) for line in group)
+        if idx == len(groups) - 1:
+            block_end = end
+        else:
+            block_end = start + (end - start) * done / total
+            if isinstance(start, int):
+                block_end = int(round(block_end))
+        blocks.append((block_start, block_end, group))
+        block_start = block_end
+    return blocks
@@ -0,0 +1,201 @@
+"""轉錄流程的分段計時與統計
+
+每個檔案以 StageTimer 累計各階段（解碼、推論、繁簡轉換、斷行、寫檔）的耗時與次數；
+BatchMetrics 彙整整個批次，輸出 JSON 日誌行與 Prometheus 文字格式，並以實測的
+realtime factor 估算剩餘時間。
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+
+STAGES = ("decode", "inference", "opencc", "split", "write")
+
+STAGE_LABELS = {
+    "decode": "解碼",
+    "inference": "推論",
+    "opencc": "OpenCC",
+    "split": "斷行",
+    "write": "寫檔",
+}
+
+METRIC_PREFIX = "mp3_transcriber"
+
+
+class StageTimer:
+    """單一檔案各階段的累計耗時（秒）與次數"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+
+    def add(self, name, seconds, calls=1):
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + calls
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed(self, name, iterable):
+        """逐項計時的迭代器：產生每一項所花的時間計入 name"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start, 0)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def as_dict(self):
+        return {name: {"seconds": round(self.seconds[name], 6), "calls": self.calls[name]} for name in self.seconds}
+
+
+def append_json_line(path, record):
+    """附加一行 JSON（多個行程同時寫入時每行仍完整）"""
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def file_report(result):
+    """批次結果中的一個檔案 -> JSON 日誌行"""
+    duration = result.get("duration") or 0.0
+    elapsed = result.get("elapsed", 0.0)
+    return {
+        "event": "file",
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "file": result["file"],
+        "success": result["success"],
+        "audio_seconds": round(duration, 3),
+        "wall_seconds": round(elapsed, 3),
+        "rtf": round(elapsed / duration, 4) if duration else None,
+        "segments": result.get("segments", 0),
+        "cache": result.get("cache"),
+        "stages": result.get("stages", {}),
+    }
+
+
+class BatchMetrics:
+    """整個批次（或整個伺服器執行期間）的累計統計；執行緒安全"""
+
+    def __init__(self, json_log=None, prometheus_file=None):
+        self.json_log = json_log
+        self.prometheus_file = prometheus_file
+        self._lock = threading.Lock()
+        self.files = {"success": 0, "failed": 0, "skipped": 0}
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.stage_calls = dict.fromkeys(STAGES, 0)
+        self.segments = 0
+        # 只計入實際轉錄的檔案（快取命中與略過的檔案不影響速度估算）
+        self.audio_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.audio_bytes = 0
+
+    def record(self, result):
+        """記錄一個檔案的結果（engine / parallel 的批次結果項目）"""
+        with self._lock:
+            if result.get("skipped"):
+                self.files["skipped"] += 1
+                return
+            self.files["success" if result["success"] else "failed"] += 1
+            for name, stage in result.get("stages", {}).items():
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + stage["seconds"]
+                self.stage_calls[name] = self.stage_calls.get(name, 0) + stage["calls"]
+            self.segments += result.get("segments", 0)
+            if result["success"] and result.get("duration") and result.get("cache") != "hit":
+                # 續跑的檔案只計入這次實際轉錄的部分
+                self.audio_seconds += result.get("transcribed", result["duration"])
+                self.wall_seconds += result.get("elapsed", 0.0)
+                self.audio_bytes += result.get("bytes", 0)
+
+        if self.json_log:
+            append_json_line(self.json_log, file_report(result))
+        if self.prometheus_file:
+            self.write_prometheus(self.prometheus_file)
+
+    @property
+    def rtf(self):
+        """處理時間 / 音訊長度；尚無資料時為 None"""
+        return self.wall_seconds / self.audio_seconds if self.audio_seconds else None
+
+    def summary(self):
+        with self._lock:
+            return {
+                "event": "batch",
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "files": dict(self.files),
+                "segments": self.segments,
+                "audio_seconds": round(self.audio_seconds, 3),
+                "wall_seconds": round(self.wall_seconds, 3),
+                "rtf": round(self.rtf, 4) if self.rtf else None,
+                "stages": {
+                    name: {"seconds": round(self.stage_seconds[name], 6), "calls": self.stage_calls[name]}
+                    for name in self.stage_seconds
+                },
+            }
+
+    def finish(self, extra=None):
+        """批次結束：寫出彙總行（可附加 extra 欄位），回傳彙總"""
+        summary = {**self.summary(), **(extra or {})}
+        if self.json_log:
+            append_json_line(self.json_log, summary)
+        if self.prometheus_file:
+            self.write_prometheus(self.prometheus_file)
+        return summary
+
+    def stage_report(self):
+        """日誌用的一行階段耗時摘要"""
+        with self._lock:
+            return " | ".join(
+                f"{STAGE_LABELS.get(name, name)} {seconds:.1f}s" for name, seconds in self.stage_seconds.items()
+            )
+
+    def prometheus_text(self):
+        """Prometheus text exposition format"""
+        p = METRIC_PREFIX
+        with self._lock:
+            lines = [
+                f"# HELP {p}_stage_seconds_total Time spent per pipeline stage.",
+                f"# TYPE {p}_stage_seconds_total counter",
+            ]
+            lines += [f'{p}_stage_seconds_total{{stage="{name}"}} {value:.6f}'
+                      for name, value in self.stage_seconds.items()]
+            lines += [
+                f"# HELP {p}_stage_calls_total Calls per pipeline stage.",
+                f"# TYPE {p}_stage_calls_total counter",
+            ]
+            lines += [f'{p}_stage_calls_total{{stage="{name}"}} {value}'
+                      for name, value in self.stage_calls.items()]
+            lines += [
+                f"# HELP {p}_files_total Files processed by result.",
+                f"# TYPE {p}_files_total counter",
+            ]
+            lines += [f'{p}_files_total{{result="{name}"}} {value}' for name, value in self.files.items()]
+            lines += [
+                f"# HELP {p}_segments_total Subtitle segments written.",
+                f"# TYPE {p}_segments_total counter",
+                f"{p}_segments_total {self.segments}",
+                f"# HELP {p}_audio_seconds_total Audio transcribed (cache hits excluded).",
+                f"# TYPE {p}_audio_seconds_total counter",
+                f"{p}_audio_seconds_total {self.audio_seconds:.3f}",
+                f"# HELP {p}_processing_seconds_total Wall time spent transcribing that audio.",
+                f"# TYPE {p}_processing_seconds_total counter",
+                f"{p}_processing_seconds_total {self.wall_seconds:.3f}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """以原子操作寫出（node_exporter textfile collector 不會讀到寫一半的檔案）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
@@ -0,0 +1,133 @@
+"""模型管理：依 (模型, 裝置, compute_type) 保存已載入的模型
+
+在記憶體預算內同時常駐多個模型，超過預算時淘汰最久未使用的模型。
+prewarm() 在背景執行緒先行載入，真正需要時若仍在載入中則等待完成，不會重複載入。
+"""
+import time
+import threading
+from collections import OrderedDict
+
+from autotune import estimated_memory, total_memory
+
+# 未指定預算時最多使用實體記憶體的一半
+DEFAULT_BUDGET_RATIO = 0.5
+
+
+def model_key(model_name, device_config):
+    return (model_name, device_config.get("device", "cpu"), device_config.get("compute_type", "default"))
+
+
+class ModelRegistry:
+    """執行緒安全的模型快取（LRU + 記憶體預算）"""
+
+    def __init__(self, memory_budget=None, log=print):
+        if memory_budget is None:
+            total = total_memory()
+            memory_budget = int(total * DEFAULT_BUDGET_RATIO) if total else None
+        self.memory_budget = memory_budget  # None 表示不限制
+        self._log = log
+        self._lock = threading.Lock()
+        self._models = OrderedDict()  # key -> (model, 估計記憶體)，最近使用的在最後
+        self._loading = {}            # key -> threading.Event
+        self._errors = {}             # key -> 背景載入失敗的例外
+        self.load_times = {}          # key -> 載入秒數
+
+    def is_resident(self, model_name, device_config):
+        with self._lock:
+            return model_key(model_name, device_config) in self._models
+
+    def get(self, model_name, device_config, log=None):
+        """回傳已載入的模型；尚未載入時在目前執行緒載入（或等待背景載入完成）"""
+        log = log or self._log
+        key = model_key(model_name, device_config)
+
+        while True:
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    return self._models[key][0]
+                event = self._loading.get(key)
+                if event is None:
+                    # 由目前執行緒負責載入
+                    self._loading[key] = threading.Event()
+                    self._errors.pop(key, None)
+                    break
+            log(f"等待背景載入模型 {model_name}...")
+            event.wait()
+            with self._lock:
+                error = self._errors.pop(key, None)
+            if error is not None:
+                raise error
+
+        return self._load(key, model_name, device_config, log)
+
+    def prewarm(self, model_name, device_config, log=None):
+        """在背景執行緒載入模型；已常駐或載入中時不做任何事"""
+        log = log or self._log
+        key = model_key(model_name, device_config)
+        with self._lock:
+            if key in self._models or key in self._loading:
+                return None
+            self._loading[key] = threading.Event()
+            self._errors.pop(key, None)
+
+        def run():
+            try:
+                self._load(key, model_name, device_config, log)
+            except Exception as e:
+                log(f"⚠ 背景載入模型 {model_name} 失敗: {e}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _load(self, key, model_name, device_config, log):
+        """呼叫前必須已在 _loading 登記 key"""
+        start = time.time()
+        try:
+            from faster_whisper import WhisperModel
+            model = WhisperModel(model_name, **device_config)
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = e
+                self._loading.pop(key).set()
+            raise
+        elapsed = time.time() - start
+        size = estimated_memory(model_name, device_config)
+
+        with self._lock:
+            try:
+                self._models[key] = (model, size)
+                self.load_times[key] = elapsed
+                evicted = self._evict()
+            finally:
+                # 無論成功與否都要通知等待中的執行緒，否則會永遠等待
+                self._loading.pop(key).set()
+
+        log(f"✓ 模型 {model_name} ({key[2]}) 載入完成，耗時 {elapsed:.1f} 秒")
+        for name, _, compute_type in evicted:
+            log(f"↷ 超過記憶體預算，釋放模型 {name} ({compute_type})")
+        return model
+
+    def _evict(self):
+        """淘汰最久未使用的模型直到符合預算（至少保留剛載入的一個）"""
+        evicted = []
+        if self.memory_budget is None:
+            return evicted
+        while len(self._models) > 1 and self.resident_memory > self.memory_budget:
+            key, _ = self._models.popitem(last=False)
+            evicted.append(key)
+        return evicted
+
+    @property
+    def resident_memory(self):
+        return sum(size for _, size in self._models.values())
+
+    def resident(self):
+        """目前常駐的模型 key（由舊到新）"""
+        with self._lock:
+            return list(self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
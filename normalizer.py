@@ -0,0 +1,98 @@
+"""字幕文字正規化：所有規則預先編譯，每段文字只掃描一次
+
+轉錄端 (engine) 與格式化端 (format_subtitles) 共用同一套引擎。
+詞彙替換採「最長匹配優先」：例如 '不想要' 一定先於 '想要' 套用，不受 dict 順序影響。
+"""
+import re
+
+# 半形 -> 全形標點（轉錄端）
+PUNCTUATION_MAP = {
+    ',': '，', '.': '。', '!': '！', '?': '？',
+    ';': '；', ':': '：', '(': '（', ')': '）',
+    '[': '「', ']': '」', '{': '『', '}': '』',
+    '"': '」', "'": '」', '-': '－', '~': '～',
+}
+
+# 中文與英數字之間加空格（零寬度比對，一次完成兩個方向）
+_CJK_LATIN_BOUNDARY = re.compile(
+    r'(?<=[\u4e00-\u9fff])(?=[a-zA-Z0-9])|(?<=[a-zA-Z0-9])(?=[\u4e00-\u9fff])'
+)
+
+
+def _alternation(words):
+    """長詞優先的交替式，確保同一位置永遠取最長匹配"""
+    ordered = sorted(set(words), key=lambda w: (-len(w), w))
+    return "|".join(re.escape(w) for w in ordered)
+
+
+class TextNormalizer:
+    """預先編譯的正規化規則
+
+    punctuation: 單字元標點對照，以 str.translate 一次轉換
+    replacements: 詞彙替換，編譯為單一正規表示式，一次掃描完成
+    fillers: 贅詞，句首（依清單順序各移除一次）或與逗號相鄰時移除
+    triggers: 句首出現時在後面補上全形逗號
+    """
+
+    def __init__(self, punctuation=None, replacements=None, fillers=None, triggers=None):
+        self.punctuation_table = str.maketrans(punctuation or {})
+
+        self.replacements = dict(replacements or {})
+        self._replace_pattern = (
+            re.compile(_alternation(self.replacements)) if self.replacements else None
+        )
+
+        if fillers:
+            alt = _alternation(fillers)
+            # 句首贅詞不能以重複的交替式一次剝除：單字贅詞（如「那」）會連帶吃掉後面的實詞
+            self._leading_fillers = tuple(re.compile(f"^{re.escape(w)}") for w in dict.fromkeys(fillers))
+            self._comma_filler = re.compile(f"(?:{alt})，|，(?:{alt})")
+        else:
+            self._leading_fillers = ()
+            self._comma_filler = None
+
+        self._trigger_pattern = (
+            re.compile(f"^({_alternation(triggers)})(?!，)") if triggers else None
+        )
+
+    def widen_punctuation(self, text):
+        """半形標點轉全形"""
+        return text.translate(self.punctuation_table)
+
+    def apply_replacements(self, text):
+        """詞彙替換（最長匹配優先，替換結果不會再被替換）"""
+        if self._replace_pattern is None:
+            return text
+        return self._replace_pattern.sub(lambda m: self.replacements[m.group(0)], text)
+
+    def remove_fillers(self, text):
+        """移除句首贅詞，以及與逗號相鄰的贅詞
+
+        >>> n = TextNormalizer(fillers=['那', '欸', '對吧', '嘛', '然後', '哦', '就是', '那當然'])
+        >>> n.remove_fillers('就是那邊的人很多')
+        '那邊的人很多'
+        >>> n.remove_fillers('然後那個東西很貴')
+        '那個東西很貴'
+        >>> n.remove_fillers('欸那天我們去')
+        '那天我們去'
+        """
+        if self._comma_filler is None:
+            return text
+        for pattern in self._leading_fillers:
+            text = pattern.sub("", text, count=1)
+        return self._comma_filler.sub("", text)
+
+    def add_trigger_commas(self, text):
+        """句首觸發詞後補上全形逗號"""
+        if self._trigger_pattern is None:
+            return text
+        return self._trigger_pattern.sub(r"\1，", text, count=1)
+
+    @staticmethod
+    def space_cjk_latin(text):
+        """中文與英數字之間加空格"""
+        return _CJK_LATIN_BOUNDARY.sub(" ", text)
+
+
+# 轉錄端使用的預設正規化器
+TRANSCRIPT_NORMALIZER = TextNormalizer(punctuation=PUNCTUATION_MAP)
@@ -0,0 +1,142 @@
+"""多行程平行批次轉錄：每個 worker 常駐一個 WhisperModel"""
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from checkpoint import JobManifest
+from engine import TranscriptionEngine, file_size, get_device_config, output_paths, split_device_config
+from metrics import BatchMetrics
+from writers import DEFAULT_FORMATS
+
+# worker 行程內的常駐引擎（由 _init_worker 建立，整個行程生命週期共用）
+_worker_engine = None
+_worker_messages = []
+
+
+def _init_worker(model_name, device_config, engine_options):
+    """worker 初始化：載入模型並常駐"""
+    global _worker_engine
+    _worker_engine = TranscriptionEngine(
+        model_name=model_name,
+        device_config=device_config,
+        log=_worker_messages.append,
+        **engine_options,
+    )
+    if _worker_engine.cache is None:
+        _worker_engine.load_model()  # 啟用快取時等到第一次未命中才載入
+
+
+def _transcribe_in_worker(file_path):
+    """在 worker 中處理單一檔案，回傳結果與該檔案的日誌"""
+    _worker_messages.clear()
+    file_start = time.time()
+    ok = _worker_engine.process_single_file(file_path)
+    # 只回傳狀態訊息，逐段文字不跨行程傳送
+    messages = [m for m in _worker_messages if m.startswith(("✓", "✖", "⚠"))]
+    return {
+        "file": file_path,
+        "success": ok,
+        "elapsed": time.time() - file_start,
+        "worker": os.getpid(),
+        "messages": messages,
+        **_worker_engine.file_stats,
+    }
+
+
+def process_batch_parallel(file_paths, model_name="medium", workers=None,
+                           device_config=None, log=print, **engine_options):
+    """將檔案分散到 N 個 worker 行程平行轉錄，回傳與 process_batch 相同格式的摘要"""
+    total_files = len(file_paths)
+    # 統計只由主行程彙整寫出，worker 只回傳各自檔案的分段計時
+    metrics = BatchMetrics(engine_options.pop("metrics_log", None), engine_options.pop("metrics_file", None))
+
+    # 工作清單只由主行程讀寫；worker 只負責各自檔案的片段日誌
+    job = JobManifest(engine_options["job_dir"]) if engine_options.get("job_dir") else None
+    formats = engine_options.get("output_formats", DEFAULT_FORMATS)
+    done_files = {
+        p for p in file_paths
+        if job and job.is_done(p) and all(os.path.exists(path) for path in output_paths(p, formats))
+    }
+    pending = [p for p in file_paths if p not in done_files]
+    results = [{"file": p, "success": True, "elapsed": 0.0, "skipped": True} for p in file_paths if p in done_files]
+    successful = len(results)
+    if results:
+        log(f"↷ {len(results)} 個檔案先前已完成，略過")
+    if not pending:
+        log(f"✓ 批次處理完成！成功: {successful}/{total_files}")
+        return {"successful": successful, "total": total_files, "cancelled": False,
+                "files": results, "wall_time": 0.0}
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(pending)))
+
+    base_config = device_config or get_device_config(log, model_name)
+    # 每個行程一次只處理一個檔案，不需要額外的 CTranslate2 worker
+    worker_config = split_device_config(base_config, workers)
+    log(f"\n啟動 {workers} 個 worker (每個 cpu_threads={worker_config.get('cpu_threads', '自動')})")
+
+    # 大檔優先排程，避免最後只剩一個 worker 在處理長檔
+    ordered = sorted(pending, key=file_size, reverse=True)
+
+    batch_start = time.time()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(model_name, worker_config, engine_options),
+    )
+    try:
+        futures = {executor.submit(_transcribe_in_worker, path): path for path in ordered}
+        for done, future in enumerate(as_completed(futures), successful + 1):
+            path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"file": path, "success": False, "elapsed": 0.0,
+                          "worker": None, "messages": [f"✖ 處理失敗: {str(e)}"]}
+
+            results.append(result)
+            metrics.record(result)
+            if result["success"]:
+                successful += 1
+                if job:
+                    job.mark_done(path)
+                log(f"✓ ({done}/{total_files}) {os.path.basename(path)} - {result['elapsed']:.1f} 秒")
+            else:
+                log(f"✖ ({done}/{total_files}) {os.path.basename(path)}")
+                for message in result["messages"]:
+                    log(f"  {message}")
+    except KeyboardInterrupt:
+        log("\n✖ 批次處理已取消")
+        raise
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    wall_time = time.time() - batch_start
+    busy_time = sum(r["elapsed"] for r in results)
+
+    log(f"\n{'='*60}")
+    log(f"✓ 批次處理完成！成功: {successful}/{total_files}")
+    if engine_options.get("vad_filter"):
+        skipped = sum(r.get("vad_skipped", 0) for r in results)
+        log(f"  VAD 共略過 {skipped:.1f} 秒非語音")
+    if engine_options.get("cache_dir"):
+        hits = sum(1 for r in results if r.get("cache") == "hit")
+        log(f"  快取命中: {hits}/{len(results)}")
+    log(f"  總耗時: {wall_time:.1f} 秒 | 累計轉錄時間: {busy_time:.1f} 秒 | 加速比: {busy_time / wall_time if wall_time else 0:.2f}x")
+    log(f"  階段耗時 (各 worker 合計): {metrics.stage_report()}")
+    log(f"{'='*60}")
+    metrics.finish()
+
+    # 依原始輸入順序回傳
+    order = {path: i for i, path in enumerate(file_paths)}
+    results.sort(key=lambda r: order.get(r["file"], 0))
+    return {
+        "successful": successful,
+        "total": total_files,
+        "cancelled": False,
+        "files": results,
+        "wall_time": wall_time,
+    }
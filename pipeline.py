@@ -0,0 +1,125 @@
+"""轉錄流程管線化：各階段在不同執行緒執行，以有上限的佇列銜接
+
+    解碼（下一個檔案，背景預先解碼）-> 推論（背景執行緒）-> 後處理與寫檔（呼叫端執行緒）
+
+佇列有上限：後段較慢時前段會等待，記憶體用量不會無限制增加。
+"""
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_QUEUE_SIZE = 32
+DEFAULT_PREFETCH_DEPTH = 1
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def background_iter(iterable, maxsize=DEFAULT_QUEUE_SIZE, name="pipeline"):
+    """在背景執行緒逐項取出 iterable，經有上限的佇列交給呼叫端
+
+    背景執行緒的例外會在呼叫端重新拋出；呼叫端提前停止（取消或例外）時，
+    背景執行緒在放入下一項時發現並結束。
+    """
+    for batch in _background(iterable, maxsize, name, drain=False):
+        yield from batch
+
+
+def background_batches(iterable, maxsize=DEFAULT_QUEUE_SIZE, name="pipeline"):
+    """與 background_iter 相同，但每次把佇列中已送達的項目全部取出，以 list 交給呼叫端
+
+    呼叫端處理一次比來源產生一項還慢時，下一次直接處理累積的全部項目，不會逐項追趕而越落越後。
+    """
+    return _background(iterable, maxsize, name, drain=True)
+
+
+def _background(iterable, maxsize, name, drain):
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as e:
+            put(_Failure(e))
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = [items.get()]
+            while drain and batch[-1] is not _DONE and not isinstance(batch[-1], _Failure):
+                try:
+                    batch.append(items.get_nowait())
+                except queue.Empty:
+                    break
+            end = batch[-1]
+            if end is _DONE or isinstance(end, _Failure):
+                # 結束標記之前已送達的項目照常交出
+                if batch[:-1]:
+                    yield batch[:-1]
+                if isinstance(end, _Failure):
+                    raise end.error
+                return
+            yield batch
+    finally:
+        stop.set()
+
+
+class AudioPrefetcher:
+    """在背景預先解碼接下來的檔案（最多 depth 個，解碼結果用完即釋放）"""
+
+    def __init__(self, decode, depth=DEFAULT_PREFETCH_DEPTH):
+        self.decode = decode
+        self.depth = depth
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._pending = OrderedDict()  # 路徑 -> Future
+        self._lock = threading.Lock()
+
+    def schedule(self, path):
+        """排入背景解碼；已排入或已達上限時略過"""
+        with self._lock:
+            if path in self._pending or len(self._pending) >= self.depth:
+                return
+            self._pending[path] = self._executor.submit(self.decode, path)
+
+    def take(self, path):
+        """取出預先解碼的音訊（必要時等待完成）；沒有排入或解碼失敗時回傳 None"""
+        with self._lock:
+            future = self._pending.pop(path, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception:
+            return None  # 由呼叫端重新解碼並回報錯誤
+
+    def discard(self, path):
+        with self._lock:
+            future = self._pending.pop(path, None)
+        if future is not None:
+            future.cancel()
+
+    def close(self):
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,87 @@
+"""逐段後處理：繁簡轉換、全形標點與斷行（每行最多 18 字，見 linebreak）
+
+Whisper 常重複輸出相同的句子（幻聽重複、口頭禪），相同文字的轉換與斷行結果
+以有上限的 LRU 快取保存，重複出現時直接取用。
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+from linebreak import MAX_LINE_LENGTH, break_lines
+from normalizer import TRANSCRIPT_NORMALIZER
+
+DEFAULT_CACHE_SIZE = 4096
+
+TRAILING_PUNCTUATION = '，。！？、；：,.!?;:'
+
+# lines: 斷行結果（日誌用）；srt_lines: 去除句尾標點後的 SRT 字幕行；text: TXT 單行文字
+FormattedText = namedtuple("FormattedText", ["lines", "srt_lines", "text"])
+
+
+def to_fullwidth(text):
+    """轉換為全形標點符號"""
+    return TRANSCRIPT_NORMALIZER.widen_punctuation(text)
+
+
+def split_subtitle_lines(text, max_length=MAX_LINE_LENGTH):
+    """斷成每行最多 max_length 字（優先斷在標點處，斷點的標點移除）"""
+    return break_lines(text, max_length, keep_punctuation=False)
+
+
+def format_segment_text(traditional_text):
+    """繁體文字 -> 全形標點、斷行與 TXT 單行文字"""
+    traditional_text = to_fullwidth(traditional_text)
+
+    # TXT 格式：保持單行但移除句尾標點
+    clean_text = traditional_text.strip().rstrip(TRAILING_PUNCTUATION)
+
+    # SRT 格式：使用分行後的結果
+    srt_lines = split_subtitle_lines(clean_text) or (clean_text,)
+
+    return FormattedText(srt_lines, srt_lines, clean_text)
+
+
+class SegmentPostProcessor:
+    """帶 LRU 快取的繁簡轉換與斷行
+
+    OpenCC 在第一次轉換時才載入（匯入與讀取字典約需數十毫秒），建立物件不會拖慢啟動。
+    """
+
+    def __init__(self, config="s2twp", cache_size=DEFAULT_CACHE_SIZE):
+        self.config = config
+        self._cc = None
+        self.convert = lru_cache(maxsize=cache_size)(self._convert)
+        self.format = lru_cache(maxsize=cache_size)(format_segment_text)
+
+    @property
+    def cc(self):
+        if self._cc is None:
+            from opencc import OpenCC
+            self._cc = OpenCC(self.config)
+        return self._cc
+
+    def _convert(self, text):
+        return self.cc.convert(text)
+
+    def clear(self):
+        self.convert.cache_clear()
+        self.format.cache_clear()
+
+    def stats(self):
+        """各快取的命中統計"""
+        stats = {}
+        for name, cached in (("convert", self.convert), ("format", self.format)):
+            info = cached.cache_info()
+            lookups = info.hits + info.misses
+            stats[name] = {
+                "hits": info.hits,
+                "misses": info.misses,
+                "size": info.currsize,
+                "hit_rate": info.hits / lookups if lookups else 0.0,
+            }
+        return stats
+
+    def stats_report(self):
+        stats = self.stats()
+        return (f"後處理快取命中率: 繁簡轉換 {stats['convert']['hit_rate']:.1%} "
+                f"({stats['convert']['hits']}/{stats['convert']['hits'] + stats['convert']['misses']}) | "
+                f"斷行 {stats['format']['hit_rate']:.1%}")
@@ -0,0 +1,92 @@
+"""字幕格式化規則包：從 JSON 檔載入並編譯，依檔案修改時間快取編譯結果
+
+規則包格式（rules/default.json）:
+    {
+      "extends": "default.json",      # 選填，繼承另一個規則包（相對路徑）
+      "replacements": {"舊詞": "新詞"},
+      "fillers": ["贅詞"],
+      "triggers": ["句首觸發詞"],
+      "punctuation": {",": "，"}
+    }
+繼承時 replacements / punctuation 以子規則包為準合併，fillers / triggers 取聯集。
+"""
+import os
+import json
+
+from normalizer import TextNormalizer
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules")
+DEFAULT_RULES_PATH = os.path.join(RULES_DIR, "default.json")
+
+# 規則包絕對路徑 -> 已編譯的 RuleSet
+_compiled = {}
+
+
+class RuleSet:
+    """編譯完成的規則包"""
+
+    def __init__(self, path, data, dependencies):
+        self.path = path
+        self.description = data.get("description", "")
+        self.replacements = data.get("replacements", {})
+        self.fillers = data.get("fillers", [])
+        self.triggers = data.get("triggers", [])
+        self.punctuation = data.get("punctuation", {})
+        self.dependencies = dependencies
+        self.normalizer = TextNormalizer(
+            punctuation=self.punctuation,
+            replacements=self.replacements,
+            fillers=self.fillers,
+            triggers=self.triggers,
+        )
+
+    @property
+    def mtime(self):
+        """規則包（含繼承來源）最後修改時間，用於判斷輸出是否過期"""
+        return max(mtime for _, mtime in self.dependencies)
+
+
+def _read_pack(path, seen=()):
+    """讀取規則包並展開 extends，回傳 (合併後的資料, 相依檔案清單)"""
+    path = os.path.abspath(path)
+    if path in seen:
+        raise ValueError(f"規則包循環繼承: {path}")
+
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    dependencies = [(path, os.path.getmtime(path))]
+
+    parent_name = data.pop("extends", None)
+    if not parent_name:
+        return data, dependencies
+
+    parent_path = os.path.join(os.path.dirname(path), parent_name)
+    parent, parent_deps = _read_pack(parent_path, seen + (path,))
+    merged = {
+        "description": data.get("description", parent.get("description", "")),
+        "replacements": {**parent.get("replacements", {}), **data.get("replacements", {})},
+        "punctuation": {**parent.get("punctuation", {}), **data.get("punctuation", {})},
+        "fillers": list(dict.fromkeys(parent.get("fillers", []) + data.get("fillers", []))),
+        "triggers": list(dict.fromkeys(parent.get("triggers", []) + data.get("triggers", []))),
+    }
+    return merged, dependencies + parent_deps
+
+
+def _is_fresh(dependencies):
+    try:
+        return all(os.path.getmtime(path) == mtime for path, mtime in dependencies)
+    except OSError:
+        return False
+
+
+def load_rules(path=None):
+    """載入規則包；檔案未修改時直接回傳已編譯的結果，修改後自動重新編譯"""
+    path = os.path.abspath(path or DEFAULT_RULES_PATH)
+    cached = _compiled.get(path)
+    if cached is not None and _is_fresh(cached.dependencies):
+        return cached
+
+    data, dependencies = _read_pack(path)
+    rule_set = RuleSet(path, data, dependencies)
+    _compiled[path] = rule_set
+    return rule_set
@@ -0,0 +1,475 @@
+"""本機轉錄工作伺服器：多位使用者把音訊送到同一台主機排隊轉錄
+
+用法:
+    python server.py --workers 2 --model medium
+API（預設只監聽 127.0.0.1:8765）:
+    POST /jobs                      {"path": "/data/錄音.mp3", "priority": 5, "model": "large-v3", "vad": true}
+    POST /jobs?name=錄音.mp3         直接上傳音訊內容（request body 為音訊檔）
+    GET  /jobs                      所有工作
+    GET  /jobs/<id>                 狀態與進度
+    GET  /jobs/<id>/result          輸出檔路徑與內容；?format=srt 或 txt 直接回傳該檔
+    POST /jobs/<id>/cancel          取消（排隊中直接取消，執行中於下一個片段停止）
+    GET  /metrics                   Prometheus 文字格式的累計統計（各階段耗時、處理速度）
+佇列保存在 SQLite，伺服器重新啟動後未完成的工作會從中斷處繼續。
+"""
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from engine import SUPPORTED_EXTENSIONS, TranscriptionEngine, get_device_config, split_device_config
+from metrics import BatchMetrics
+from models import ModelRegistry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_DATA_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "server")
+
+JOB_LOG_LINES = 200
+UPLOAD_CHUNK = 1024 * 1024
+
+# 工作狀態
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    model TEXT NOT NULL,
+    vad INTEGER NOT NULL DEFAULT 0,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    error TEXT,
+    outputs TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, priority DESC, submitted);
+"""
+
+
+class JobStore:
+    """以 SQLite 保存的優先權佇列（同一行程內以鎖保護）"""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        with self.lock, self.db:
+            # 上次關閉時執行中的工作重新排隊；片段日誌讓它們從中斷處繼續
+            self.db.execute("UPDATE jobs SET state = ?, started = NULL WHERE state = ?", (QUEUED, RUNNING))
+
+    def submit(self, path, model, vad=False, priority=0):
+        job_id = uuid.uuid4().hex[:12]
+        with self.available, self.db:
+            self.db.execute(
+                "INSERT INTO jobs (id, path, model, vad, priority, state, submitted) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, path, model, int(vad), priority, QUEUED, time.time()),
+            )
+            self.available.notify()
+        return job_id
+
+    def claim(self, stop_event, on_claim=None):
+        """取出優先權最高（同優先權先到先處理）的工作並標記為執行中；停止時回傳 None
+
+        on_claim(job) 在同一個鎖內呼叫，讓呼叫端登記工作時不會與取消要求互相錯過。
+        """
+        with self.available:
+            while not stop_event.is_set():
+                row = self.db.execute(
+                    "SELECT * FROM jobs WHERE state = ? ORDER BY priority DESC, submitted LIMIT 1", (QUEUED,)
+                ).fetchone()
+                if row is not None:
+                    with self.db:
+                        self.db.execute("UPDATE jobs SET state = ?, started = ? WHERE id = ?",
+                                        (RUNNING, time.time(), row["id"]))
+                    job = dict(row)
+                    if on_claim:
+                        on_claim(job)
+                    return job
+                self.available.wait(timeout=1.0)
+        return None
+
+    def finish(self, job_id, state, outputs=None, error=None):
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE jobs SET state = ?, finished = ?, outputs = ?, error = ? WHERE id = ?",
+                (state, time.time(), json.dumps(outputs) if outputs else None, error, job_id),
+            )
+
+    def cancel_queued(self, job_id):
+        """排隊中的工作直接取消；回傳是否成功"""
+        with self.lock, self.db:
+            cursor = self.db.execute("UPDATE jobs SET state = ?, finished = ? WHERE id = ? AND state = ?",
+                                     (CANCELLED, time.time(), job_id, QUEUED))
+            return cursor.rowcount > 0
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self):
+        with self.lock:
+            rows = self.db.execute("SELECT * FROM jobs ORDER BY submitted").fetchall()
+        return [dict(row) for row in rows]
+
+    def position(self, job):
+        """排隊中的工作前面還有幾個"""
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state = ? AND (priority > ? OR (priority = ? AND submitted < ?))",
+                (QUEUED, job["priority"], job["priority"], job["submitted"]),
+            ).fetchone()[0]
+
+
+class JobServer:
+    """管理佇列與 worker 執行緒；所有 worker 共用同一個 ModelRegistry"""
+
+    def __init__(self, data_dir=DEFAULT_DATA_DIR, workers=1, model_name="medium",
+                 device_config=None, memory_budget=None, audio_store=False, log=print):
+        self.data_dir = data_dir
+        self.upload_dir = os.path.join(data_dir, "uploads")
+        os.makedirs(self.upload_dir, exist_ok=True)
+        # 解碼後的音訊保存在 data_dir 中，重新啟動後續跑的工作不必再解碼
+        self.audio_store_dir = os.path.join(data_dir, "audio") if audio_store else None
+        self.store = JobStore(os.path.join(data_dir, "jobs.sqlite3"))
+        self.default_model = model_name
+        self.workers = max(1, workers)
+        self._log = log
+        self.stop_event = threading.Event()
+
+        # 同一個模型同時轉錄多個工作：每個 worker 一個 CTranslate2 worker，執行緒平分
+        base_config = device_config or get_device_config(log, model_name)
+        self.device_config = split_device_config(base_config, self.workers, self.workers)
+        self.models = ModelRegistry(memory_budget, log=log)
+        self.metrics = BatchMetrics()  # 伺服器啟動以來所有工作的累計統計
+
+        self._cancel_events = {}  # job_id -> 執行中工作的取消旗標
+        self._progress = {}  # job_id -> 0-1
+        self._logs = {}      # job_id -> 最近的日誌
+        self._state_lock = threading.Lock()
+        self._threads = []
+
+    def log(self, message):
+        self._log(message)
+
+    def start(self, prewarm=True):
+        if prewarm:
+            self.models.prewarm(self.default_model, self.device_config)
+        for idx in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f"job-worker-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """停止接新工作並取消執行中的工作（重新啟動後會從中斷處繼續）"""
+        self.stop_event.set()
+        with self._state_lock:
+            for event in self._cancel_events.values():
+                event.set()
+        with self.store.available:
+            self.store.available.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    # --- 工作操作 ---
+
+    def submit(self, path, model=None, vad=False, priority=0):
+        path = os.path.abspath(path)
+        if not os.path.isfile(path):
+            raise ValueError(f"找不到檔案: {path}")
+        if not path.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise ValueError(f"不支援的格式: {os.path.basename(path)}")
+        job_id = self.store.submit(path, model or self.default_model, vad, int(priority))
+        self.log(f"+ 工作 {job_id}: {os.path.basename(path)} (優先權 {priority})")
+        return job_id
+
+    def save_upload(self, name, stream, length):
+        """把上傳的音訊寫入 uploads/ 並回傳路徑"""
+        name = os.path.basename(name or "upload.mp3")
+        target_dir = os.path.join(self.upload_dir, uuid.uuid4().hex[:12])
+        os.makedirs(target_dir)
+        path = os.path.join(target_dir, name)
+        remaining = length
+        with open(path, "wb") as f:
+            while remaining > 0:
+                chunk = stream.read(min(UPLOAD_CHUNK, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        return path
+
+    def cancel(self, job_id):
+        if self.store.cancel_queued(job_id):
+            self.log(f"✖ 工作 {job_id} 已取消")
+            job = self.store.get(job_id)
+            if job is not None:
+                self._cleanup(job_id, job["path"])
+            return True
+        with self._state_lock:
+            event = self._cancel_events.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        return True
+
+    def status(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        job["vad"] = bool(job["vad"])
+        job["outputs"] = json.loads(job["outputs"]) if job["outputs"] else None
+        with self._state_lock:
+            job["progress"] = 1.0 if job["state"] == DONE else self._progress.get(job_id, 0.0)
+            job["log"] = list(self._logs.get(job_id, ()))
+        if job["state"] == QUEUED:
+            job["queue_position"] = self.store.position(job)
+        return job
+
+    def jobs(self):
+        return [self.status(job["id"]) for job in self.store.list()]
+
+    # --- worker ---
+
+    def _worker_loop(self):
+        while not self.stop_event.is_set():
+            job = self.store.claim(self.stop_event, on_claim=self._register)
+            if job is None:
+                return
+            self._run_job(job, self._cancel_events[job["id"]])
+
+    def _register(self, job):
+        with self._state_lock:
+            self._cancel_events[job["id"]] = threading.Event()
+
+    def _run_job(self, job, cancel_event):
+        job_id = job["id"]
+        job_log = deque(maxlen=JOB_LOG_LINES)
+
+        def log(message):
+            job_log.append(message)
+            if message.lstrip().startswith(("✓", "✖", "⚠")):
+                self.log(f"[{job_id}] {message.strip()}")
+
+        def on_progress(progress, time_text=None):
+            with self._state_lock:
+                self._progress[job_id] = progress
+
+        engine = TranscriptionEngine(
+            model_name=job["model"],
+            device_config=self.device_config,
+            log=log,
+            on_progress=on_progress,
+            vad_filter=bool(job["vad"]),
+            # 每個工作各自的續跑狀態：伺服器重新啟動後從最後記錄的片段繼續
+            job_dir=os.path.join(self.data_dir, "journals", job_id),
+            audio_store_dir=self.audio_store_dir,
+            models=self.models,
+        )
+        with self._state_lock:
+            self._logs[job_id] = job_log
+
+        try:
+            result = engine.process_batch([job["path"]], cancel_event)
+            for entry in result["files"]:
+                self.metrics.record(entry)
+            if result["successful"]:
+                engine.job.clear()
+                outputs = dict(zip(engine.output_formats, result["files"][0].get("outputs", [])))
+                self.store.finish(job_id, DONE, outputs=outputs)
+            elif self.stop_event.is_set():
+                return  # 伺服器關閉：保持執行中狀態，下次啟動時重新排隊續跑
+            elif result["cancelled"]:
+                self.store.finish(job_id, CANCELLED)
+            else:
+                self.store.finish(job_id, FAILED, error=_last_error(job_log))
+            self._cleanup(job_id, job["path"])
+        except Exception as e:
+            log(f"✖ 錯誤: {e}")
+            self.store.finish(job_id, FAILED, error=str(e))
+            self._cleanup(job_id, job["path"])
+        finally:
+            with self._state_lock:
+                self._cancel_events.pop(job_id, None)
+                # 結束的工作不再保留進度與日誌；失敗原因已寫入資料庫的 error 欄位
+                self._progress.pop(job_id, None)
+                self._logs.pop(job_id, None)
+
+    def _cleanup(self, job_id, path):
+        """工作結束後刪除續跑狀態與上傳的音訊（輸出檔保留在同一個資料夾供下載）"""
+        shutil.rmtree(os.path.join(self.data_dir, "journals", job_id), ignore_errors=True)
+        self.discard_upload(path)
+
+    def discard_upload(self, path):
+        """刪除 uploads/ 內的音訊；資料夾內沒有輸出檔（失敗、取消或未受理）時連同資料夾刪除"""
+        if os.path.dirname(os.path.dirname(os.path.abspath(path))) != os.path.abspath(self.upload_dir):
+            return
+        try:
+            os.remove(path)
+            os.rmdir(os.path.dirname(path))
+        except OSError:
+            pass
+
+
+def _last_error(lines):
+    for line in reversed(lines):
+        if "✖" in line:
+            return line.strip()
+    return "轉錄失敗"
+
+
+JOB_PATH = re.compile(r"^/jobs/([0-9a-f]+)(/result|/cancel)?/?$")
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server_version = "mp3-transcriber"
+
+    @property
+    def jobs(self):
+        return self.server.job_server
+
+    def log_message(self, format, *args):
+        pass  # 工作狀態已由 JobServer 記錄
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_text(self, status, text):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.rstrip("/") == "/jobs":
+            return self.send_json(200, {"jobs": self.jobs.jobs()})
+        if url.path == "/metrics":
+            return self.send_text(200, self.jobs.metrics.prometheus_text())
+
+        match = JOB_PATH.match(url.path)
+        if not match or match.group(2) == "/cancel":
+            return self.send_json(404, {"error": "not found"})
+        job = self.jobs.status(match.group(1))
+        if job is None:
+            return self.send_json(404, {"error": "找不到工作"})
+        if match.group(2) is None:
+            return self.send_json(200, job)
+
+        if job["state"] != DONE:
+            return self.send_json(409, {"error": f"工作尚未完成 ({job['state']})", "state": job["state"]})
+        fmt = parse_qs(url.query).get("format", [None])[0]
+        if fmt:
+            if fmt not in job["outputs"]:
+                return self.send_json(404, {"error": f"沒有 {fmt} 輸出"})
+            with open(job["outputs"][fmt], "r", encoding="utf-8") as f:
+                return self.send_text(200, f.read())
+        contents = {}
+        for name, path in job["outputs"].items():
+            with open(path, "r", encoding="utf-8") as f:
+                contents[name] = f.read()
+        return self.send_json(200, {"id": job["id"], "outputs": job["outputs"], "contents": contents})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        match = JOB_PATH.match(url.path)
+        if match and match.group(2) == "/cancel":
+            if self.jobs.cancel(match.group(1)):
+                return self.send_json(202, {"id": match.group(1), "cancelling": True})
+            return self.send_json(409, {"error": "工作不存在或已結束"})
+        if url.path.rstrip("/") != "/jobs":
+            return self.send_json(404, {"error": "not found"})
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        upload = None
+        try:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(request, dict):
+                    raise ValueError("請求內容必須是 JSON 物件")
+                path = request["path"]
+            else:
+                request = query
+                path = upload = self.jobs.save_upload(query.get("name"), self.rfile, length)
+            job_id = self.jobs.submit(
+                path,
+                model=request.get("model"),
+                vad=str(request.get("vad", "")).lower() in ("1", "true"),
+                priority=int(request.get("priority", 0)),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            if upload is not None:
+                self.jobs.discard_upload(upload)
+            return self.send_json(400, {"error": str(e)})
+        return self.send_json(201, {"id": job_id, "state": QUEUED})
+
+    def do_DELETE(self):
+        match = JOB_PATH.match(urlparse(self.path).path)
+        if not match or match.group(2):
+            return self.send_json(404, {"error": "not found"})
+        if self.jobs.cancel(match.group(1)):
+            return self.send_json(202, {"id": match.group(1), "cancelling": True})
+        return self.send_json(409, {"error": "工作不存在或已結束"})
+
+
+def serve(job_server, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+    httpd.daemon_threads = True
+    httpd.job_server = job_server
+    return httpd
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本機轉錄工作伺服器")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"監聽位址 (預設: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"連接埠 (預設: {DEFAULT_PORT})")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="佇列、上傳檔與續跑狀態的資料夾")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="同時轉錄的工作數 (預設: 1)")
+    parser.add_argument("-m", "--model", default="medium", help="未指定模型時使用的模型 (預設: medium)")
+    parser.add_argument("--model-memory-mb", type=int, default=None, help="常駐模型的記憶體預算 (MB)")
+    parser.add_argument("--audio-store", action="store_true", help="解碼後的音訊保存在資料夾中，續跑時不重複解碼")
+    args = parser.parse_args(argv)
+
+    job_server = JobServer(
+        data_dir=args.data_dir,
+        workers=args.workers,
+        model_name=args.model,
+        memory_budget=args.model_memory_mb * 1024 * 1024 if args.model_memory_mb else None,
+        audio_store=args.audio_store,
+    )
+    httpd = serve(job_server, args.host, args.port)
+    job_server.start()
+    print(f"✓ 工作伺服器啟動: http://{args.host}:{args.port}/jobs ({job_server.workers} 個 worker)", flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止，執行中的工作下次啟動時會繼續...", flush=True)
+    finally:
+        httpd.server_close()
+        job_server.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
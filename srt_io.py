@@ -0,0 +1,141 @@
+"""SRT 串流讀寫：逐塊解析，記憶體用量與檔案大小無關
+
+時間以整數毫秒保存，不保留原始字串。讀取端可處理 CRLF、BOM、多個空行、
+缺少序號的區塊，以及沒有空行分隔、直接串接在一起的字幕檔。
+"""
+import re
+from collections import namedtuple
+
+# index: 序號 (int)；start_ms / end_ms: 毫秒 (int)；lines: 字幕行 (tuple of str)
+SrtBlock = namedtuple("SrtBlock", ["index", "start_ms", "end_ms", "lines"])
+
+TIMESTAMP_PATTERN = re.compile(
+    r"^\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})"
+)
+
+READ_BUFFER = 1024 * 1024
+
+
+def seconds_to_ms(seconds):
+    """秒數 -> 毫秒（與既有輸出一致，毫秒部分無條件捨去）"""
+    m, s = divmod(seconds, 60)
+    h, m = divmod(m, 60)
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int((s - int(s)) * 1000)
+
+
+def ms_to_timestamp(ms):
+    """毫秒 -> HH:MM:SS,mmm"""
+    s, ms = divmod(ms, 1000)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def _parse_ms(h, m, s, frac):
+    # ",5" 表示 500 毫秒，不是 5 毫秒
+    return ((int(h) * 60 + int(m)) * 60 + int(s)) * 1000 + int(frac.ljust(3, "0"))
+
+
+def _build_block(lines, ts_pos, match, previous_index):
+    """lines[ts_pos] 為時間軸行；其前一行若為數字即為序號，否則沿用前一塊序號 + 1"""
+    index = previous_index + 1
+    if ts_pos > 0:
+        candidate = lines[ts_pos - 1].strip()
+        if candidate.isdigit():
+            index = int(candidate)
+
+    g = match.groups()
+    return SrtBlock(
+        index=index,
+        start_ms=_parse_ms(*g[:4]),
+        end_ms=_parse_ms(*g[4:]),
+        lines=tuple(lines[ts_pos + 1:]),
+    )
+
+
+def read_srt(lines, stats=None):
+    """逐塊產生 SrtBlock；lines 可為開啟的檔案或任何字串迭代器
+
+    stats (dict) 會累計 blocks 與 malformed（沒有時間軸而略過的區塊數）。
+    """
+    if stats is None:
+        stats = {}
+    stats.setdefault("blocks", 0)
+    stats.setdefault("malformed", 0)
+
+    buf = []
+    match = None      # 目前區塊的時間軸比對結果
+    ts_pos = 0        # 時間軸行在 buf 中的位置
+    previous_index = 0
+    first = True
+
+    for raw in lines:
+        line = raw.rstrip("\r\n")
+        if first:
+            line = line.lstrip("\ufeff")
+            first = False
+
+        if not line or line.isspace():
+            if buf:
+                if match is None:
+                    stats["malformed"] += 1
+                else:
+                    block = _build_block(buf, ts_pos, match, previous_index)
+                    previous_index = block.index
+                    stats["blocks"] += 1
+                    yield block
+                buf = []
+                match = None
+            continue
+
+        new_match = TIMESTAMP_PATTERN.match(line) if "-->" in line else None
+        if new_match:
+            if match is not None:
+                # 沒有空行分隔：新的時間軸前若是序號，該序號屬於下一塊
+                carry = [buf.pop()] if len(buf) > ts_pos + 1 and buf[-1].strip().isdigit() else []
+                block = _build_block(buf, ts_pos, match, previous_index)
+                previous_index = block.index
+                stats["blocks"] += 1
+                yield block
+                buf = carry
+            match = new_match
+            ts_pos = len(buf)
+        buf.append(line)
+
+    if buf:
+        if match is None:
+            stats["malformed"] += 1
+        else:
+            stats["blocks"] += 1
+            yield _build_block(buf, ts_pos, match, previous_index)
+
+
+def iter_srt_file(path, stats=None):
+    """開啟 SRT 檔並逐塊讀取（自動處理 BOM 與 CRLF）"""
+    with open(path, "r", encoding="utf-8-sig", buffering=READ_BUFFER) as f:
+        yield from read_srt(f, stats)
+
+
+def format_block(block):
+    """SrtBlock -> SRT 文字（不含結尾空行）"""
+    header = f"{block.index}\n{ms_to_timestamp(block.start_ms)} --> {ms_to_timestamp(block.end_ms)}"
+    if not block.lines:
+        return header
+    return header + "\n" + "\n".join(block.lines)
+
+
+class SrtStreamWriter:
+    """逐塊寫出 SRT；區塊之間以一個空行分隔"""
+
+    def __init__(self, file, trailing_blank_line=False):
+        self.file = file
+        self.trailing_blank_line = trailing_blank_line
+        self.count = 0
+
+    def write(self, block):
+        if self.trailing_blank_line:
+            self.file.write(format_block(block) + "\n\n")
+        else:
+            # 與 '\n\n'.join(...) 的輸出相同，檔尾不多加空行
+            self.file.write(("\n\n" if self.count else "") + format_block(block))
+        self.count += 1
@@ -0,0 +1,392 @@
+"""即時串流轉錄：邊收音訊邊輸出字幕
+
+音訊來源為持續寫入中的 WAV / PCM 檔，或由標準輸入送入的 PCM（16-bit little-endian）。
+每收到 step 秒的新音訊就對尚未定案的音訊（最長 window 秒）重新推論：
+    - 連續兩次推論結果相同的片段定案（final），寫入字幕檔，之後不再改變
+    - 其餘片段為暫定（provisional），下一次推論可能修正
+延遲上限約為 step 秒加上一次推論的時間；所有片段都經過繁簡轉換與斷行。
+
+用法:
+    python streaming.py 直播錄音.wav                     # 追蹤寫入中的檔案，字幕輸出在檔案旁
+    ffmpeg -i rtmp://... -f s16le -ac 1 -ar 16000 - | python streaming.py - -o 直播
+"""
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from chunking import SAMPLE_RATE, Segment
+from engine import TranscriptionEngine
+from linebreak import join_lines, retime
+from pipeline import background_batches
+from writers import DEFAULT_FORMATS, OutputSet, SubtitleEntry, format_time
+
+DEFAULT_STEP_SECONDS = 1.0
+DEFAULT_WINDOW_SECONDS = 30.0
+DEFAULT_CHUNK_SECONDS = 0.25
+DEFAULT_IDLE_TIMEOUT = 10.0
+# 視窗內完全沒有語音時保留的尾端音訊（可能是一句話的開頭）
+SILENCE_KEEP_SECONDS = 5.0
+# 定案文字的最後幾個字作為下一次推論的 prompt，讓句子銜接
+PROMPT_CONTEXT_CHARS = 60
+# 兩次推論的片段開始時間相差在此範圍內才視為同一個片段
+AGREEMENT_TOLERANCE = 0.5
+PCM_EXTENSIONS = ('.pcm', '.raw')
+
+# kind: "provisional" 或 "final"；entries: SubtitleEntry 清單（provisional 每次整批取代）
+StreamEvent = namedtuple("StreamEvent", ["kind", "entries"])
+
+
+def pcm_to_float(data, channels=1, sample_rate=SAMPLE_RATE):
+    """16-bit PCM bytes -> 16 kHz 單聲道 float32"""
+    audio = np.frombuffer(data, dtype="<i2").astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if sample_rate != SAMPLE_RATE and len(audio):
+        # 線性內插重取樣；即時字幕用途足夠，且每塊獨立處理不需保留狀態
+        target = int(round(len(audio) * SAMPLE_RATE / sample_rate))
+        audio = np.interp(
+            np.arange(target) * sample_rate / SAMPLE_RATE, np.arange(len(audio)), audio
+        ).astype(np.float32)
+    return audio
+
+
+def read_pcm(stream, channels=1, sample_rate=SAMPLE_RATE, chunk_seconds=DEFAULT_CHUNK_SECONDS):
+    """從二進位串流讀取 PCM，逐塊產生 float32 音訊，直到 EOF"""
+    frame_bytes = 2 * channels
+    size = max(frame_bytes, int(chunk_seconds * sample_rate) * frame_bytes)
+    pending = b""
+    while True:
+        data = stream.read(size)
+        if not data:
+            return
+        pending += data
+        usable = len(pending) - len(pending) % frame_bytes
+        if usable:
+            yield pcm_to_float(pending[:usable], channels, sample_rate)
+            pending = pending[usable:]
+
+
+def _wav_format(f):
+    """解析 WAV 檔頭，回傳 (聲道數, 取樣率, data 區塊位置)；寫入中的檔案 data 長度可能尚未填入"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        raise ValueError("不是 WAV 檔")
+    channels = sample_rate = None
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAV 檔頭不完整（檔案可能剛建立）")
+        name, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if name == b"data":
+            if channels is None:
+                raise ValueError("WAV 缺少 fmt 區塊")
+            return channels, sample_rate, f.tell()
+        body = f.read(size + size % 2)
+        if name == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack("<HHI", body[:8])
+            bits = struct.unpack("<H", body[14:16])[0]
+            if audio_format not in (1, 0xFFFE) or bits != 16:
+                raise ValueError("只支援 16-bit PCM WAV")
+
+
+def follow_file(path, chunk_seconds=DEFAULT_CHUNK_SECONDS, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                poll_interval=0.2, channels=1, sample_rate=SAMPLE_RATE):
+    """追蹤寫入中的 WAV 或 PCM 檔，逐塊產生新增的音訊；idle_timeout 秒沒有新資料即視為錄音結束"""
+    is_pcm = path.lower().endswith(PCM_EXTENSIONS)
+    if not is_pcm and not path.lower().endswith(".wav"):
+        raise ValueError("寫入中的檔案只支援 WAV 或 PCM；其他格式請以 ffmpeg 轉成 PCM 再由標準輸入送入")
+
+    with open(path, "rb") as f:
+        if not is_pcm:
+            deadline = time.monotonic() + (idle_timeout or DEFAULT_IDLE_TIMEOUT)
+            while True:
+                try:
+                    channels, sample_rate, _ = _wav_format(f)
+                    break
+                except ValueError:
+                    if time.monotonic() > deadline:
+                        raise
+                    f.seek(0)
+                    time.sleep(poll_interval)
+
+        frame_bytes = 2 * channels
+        size = max(frame_bytes, int(chunk_seconds * sample_rate) * frame_bytes)
+        pending = b""
+        last_data = time.monotonic()
+        while True:
+            data = f.read(size)
+            if not data:
+                if idle_timeout is not None and time.monotonic() - last_data > idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                continue
+            last_data = time.monotonic()
+            pending += data
+            usable = len(pending) - len(pending) % frame_bytes
+            if usable:
+                yield pcm_to_float(pending[:usable], channels, sample_rate)
+                pending = pending[usable:]
+
+
+class StreamingTranscriber:
+    """滾動視窗推論：定案的片段不再改變，尚未定案的音訊保留在緩衝區中重新推論
+
+    模型、裝置設定、繁簡轉換與斷行皆沿用傳入的 TranscriptionEngine。
+    """
+
+    def __init__(self, engine, step=DEFAULT_STEP_SECONDS, window=DEFAULT_WINDOW_SECONDS, on_event=None):
+        self.engine = engine
+        self.step = step
+        self.window = window
+        self.on_event = on_event or (lambda event: None)
+
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.buffer_start = 0.0  # 緩衝區開頭在整段串流中的時間（秒）
+        self.received = 0.0      # 已收到的音訊長度（秒）
+        self.pending_seconds = 0.0  # 上次推論之後新收到的音訊長度
+        self.hypothesis = []     # 上一次推論中尚未定案的片段
+        self.committed_text = ""
+        self.next_index = 1
+        self.passes = 0
+        self.pass_seconds = []   # 每次推論的耗時（即延遲中推論的部分）
+
+    @property
+    def buffer_end(self):
+        return self.buffer_start + len(self.buffer) / SAMPLE_RATE
+
+    def feed(self, audio):
+        """加入新的音訊；累積滿 step 秒即推論一次（一次送入多個 step 的音訊也只推論一次）"""
+        self.buffer = np.concatenate((self.buffer, audio))
+        seconds = len(audio) / SAMPLE_RATE
+        self.received += seconds
+        self.pending_seconds += seconds
+        if self.pending_seconds >= self.step:
+            self.pending_seconds = 0.0
+            self._run_pass()
+
+    def finish(self):
+        """串流結束：剩餘的片段全部定案"""
+        if len(self.buffer):
+            self._run_pass(final=True)
+        elif self.hypothesis:
+            self._commit(self.hypothesis)
+            self.hypothesis = []
+            self.on_event(StreamEvent("provisional", []))
+
+    def _options(self):
+        prompt = self.engine.initial_prompt or ""
+        if self.committed_text:
+            prompt += self.committed_text[-PROMPT_CONTEXT_CHARS:]
+        options = dict(
+            beam_size=self.engine.beam_size,
+            language=self.engine.language,
+            initial_prompt=prompt or None,
+        )
+        if self.engine.vad_filter:
+            options["vad_filter"] = True
+            if self.engine.vad_parameters:
+                options["vad_parameters"] = dict(self.engine.vad_parameters)
+        return options
+
+    def _transcribe(self):
+        model = self.engine.load_model()
+        start = time.perf_counter()
+        segments, _ = model.transcribe(self.buffer, **self._options())
+        segments = [
+            Segment(self.buffer_start + seg.start, self.buffer_start + seg.end, seg.text.strip())
+            for seg in segments if seg.text.strip()
+        ]
+        self.pass_seconds.append(time.perf_counter() - start)
+        self.passes += 1
+        return segments
+
+    def _agreed(self, segment):
+        return any(
+            previous.text == segment.text and abs(previous.start - segment.start) <= AGREEMENT_TOLERANCE
+            for previous in self.hypothesis
+        )
+
+    def _run_pass(self, final=False):
+        segments = self._transcribe()
+
+        if final:
+            ready, provisional = segments, []
+        else:
+            # 最後一個片段可能在句子中間被截斷，不定案；其餘依序與上一次結果一致才定案
+            count = 0
+            for segment in segments[:-1]:
+                if not self._agreed(segment):
+                    break
+                count += 1
+            # 超過視窗長度時強制定案，確保每次推論的音訊長度有上限
+            if self.buffer_end - self.buffer_start > self.window:
+                count = max(count, len(segments) - 1)
+            ready, provisional = segments[:count], segments[count:]
+
+        if ready:
+            self._commit(ready)
+            self._trim(ready[-1].end)
+        elif not segments and self.buffer_end - self.buffer_start > self.window:
+            self._trim(self.buffer_end - SILENCE_KEEP_SECONDS)
+        elif len(segments) == 1 and self.buffer_end - self.buffer_start > self.window:
+            # 單一片段超過視窗長度（很長的句子）：直接定案
+            self._commit(segments)
+            self._trim(segments[0].end)
+            provisional = []
+
+        self.hypothesis = provisional
+        self.on_event(StreamEvent("provisional", [entry for seg in provisional for entry in self._entries(seg)]))
+
+    def _trim(self, until):
+        """丟棄 until 秒之前的音訊"""
+        cut = int(max(0.0, until - self.buffer_start) * SAMPLE_RATE)
+        cut = min(cut, len(self.buffer))
+        self.buffer = self.buffer[cut:]
+        self.buffer_start += cut / SAMPLE_RATE
+
+    def _entries(self, segment):
+        """片段 -> 字幕區塊（與離線轉錄相同的斷行；超過行數上限時拆成多個區塊）"""
+        converted = self.engine.postprocessor.convert(segment.text)
+        _, srt_lines, clean_text = self.engine.postprocessor.format(converted)
+        blocks = retime(segment.start, segment.end, srt_lines, self.engine.max_lines)
+        return [
+            SubtitleEntry(None, start, end, lines, clean_text if len(blocks) == 1 else join_lines(lines))
+            for start, end, lines in blocks
+        ]
+
+    def _commit(self, segments):
+        entries = []
+        for segment in segments:
+            for entry in self._entries(segment):
+                entries.append(entry._replace(index=self.next_index))
+                self.next_index += 1
+            self.committed_text += segment.text
+        self.on_event(StreamEvent("final", entries))
+
+    def stats(self):
+        return {
+            "audio_seconds": round(self.received, 3),
+            "segments": self.next_index - 1,
+            "passes": self.passes,
+            "mean_pass_seconds": round(sum(self.pass_seconds) / len(self.pass_seconds), 3) if self.pass_seconds else None,
+            "max_pass_seconds": round(max(self.pass_seconds), 3) if self.pass_seconds else None,
+        }
+
+
+def transcribe_stream(chunks, engine, source_path, step=DEFAULT_STEP_SECONDS, window=DEFAULT_WINDOW_SECONDS,
+                      formats=DEFAULT_FORMATS, on_event=None):
+    """串流轉錄 chunks（float32 音訊塊的迭代器），定案的片段寫入 source_path 對應的字幕檔
+
+    中斷（Ctrl+C）時剩餘的音訊仍會定案並儲存。回傳 (輸出檔路徑, 統計)。
+    """
+    outputs = OutputSet(source_path, formats)
+
+    def handle(event):
+        if event.kind == "final":
+            for entry in event.entries:
+                outputs.write(entry)
+        if on_event:
+            on_event(event)
+
+    streamer = StreamingTranscriber(engine, step=step, window=window, on_event=handle)
+    # 讀取在背景執行緒進行，推論期間送來的音訊不會塞住來源（例如 ffmpeg 的管線）。
+    # 每次取出推論期間累積的全部音訊，合併後只推論一次：推論比 step 慢時延遲不會越積越多
+    chunks = background_batches(chunks, maxsize=int(window / DEFAULT_CHUNK_SECONDS) * 4, name="stream-reader")
+    try:
+        try:
+            for batch in chunks:
+                streamer.feed(np.concatenate(batch))
+        except KeyboardInterrupt:
+            engine.log("\n↷ 停止收音，整理剩餘的片段...")
+        finally:
+            chunks.close()
+        streamer.finish()
+    except BaseException:
+        outputs.abort()
+        raise
+    outputs.commit()
+    return outputs.paths, streamer.stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="即時串流轉錄")
+    parser.add_argument("source", help="寫入中的 WAV / PCM 檔，或 - 表示從標準輸入讀取 16-bit PCM")
+    parser.add_argument("-m", "--model", default="small", help="Whisper 模型 (預設: small，即時字幕建議使用較小的模型)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="輸出檔名（不含副檔名）；預設為來源檔旁，標準輸入時為 stream_<時間>")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP_SECONDS,
+                        help=f"每收到幾秒新音訊推論一次 (預設: {DEFAULT_STEP_SECONDS:g})")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW_SECONDS,
+                        help=f"尚未定案音訊的最長秒數 (預設: {DEFAULT_WINDOW_SECONDS:g})")
+    parser.add_argument("--sample-rate", type=int, default=SAMPLE_RATE, help="標準輸入 / PCM 檔的取樣率 (預設: 16000)")
+    parser.add_argument("--channels", type=int, default=1, help="標準輸入 / PCM 檔的聲道數 (預設: 1)")
+    parser.add_argument("--idle-timeout", type=float, default=DEFAULT_IDLE_TIMEOUT,
+                        help=f"檔案幾秒沒有新資料即視為錄音結束 (預設: {DEFAULT_IDLE_TIMEOUT:g})")
+    parser.add_argument("--vad", action="store_true", help="推論前以 VAD 略過靜音，減少無聲時的幻聽")
+    parser.add_argument("--json", action="store_true", help="以 JSON 行輸出事件（供其他程式顯示字幕）")
+    args = parser.parse_args(argv)
+
+    # 日誌一律輸出到 stderr，stdout 只有字幕事件
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    def show(event):
+        if args.json:
+            print(json.dumps({
+                "type": event.kind,
+                "segments": [
+                    {"index": e.index, "start": round(e.start, 3), "end": round(e.end, 3), "lines": list(e.lines), "text": e.text}
+                    for e in event.entries
+                ],
+            }, ensure_ascii=False), flush=True)
+            return
+        for entry in event.entries:
+            if event.kind == "final":
+                print(f"[{format_time(entry.start)}] {' / '.join(entry.lines)}", flush=True)
+            else:
+                print(f"  … {' / '.join(entry.lines)}", flush=True)
+
+    if args.source == "-":
+        chunks = read_pcm(sys.stdin.buffer, args.channels, args.sample_rate)
+        source_path = None
+    else:
+        if not os.path.exists(args.source):
+            log(f"✖ 檔案不存在: {args.source}")
+            return 1
+        chunks = follow_file(args.source, idle_timeout=args.idle_timeout,
+                             channels=args.channels, sample_rate=args.sample_rate)
+        source_path = args.source
+
+    engine = TranscriptionEngine(model_name=args.model, log=log, vad_filter=args.vad)
+    engine.load_model()
+    log(f"✓ 開始串流轉錄（每 {args.step:g} 秒更新，視窗 {args.window:g} 秒）")
+
+    # 輸出檔名依來源路徑決定（與離線轉錄相同的 _cht.srt / _cht.txt）；標準輸入沒有來源檔，以 -o 的名稱代替
+    if args.output or source_path is None:
+        source_path = f"{args.output or time.strftime('stream_%Y%m%d_%H%M%S')}.pcm"
+
+    try:
+        paths, stats = transcribe_stream(
+            chunks, engine, source_path,
+            step=args.step, window=args.window, on_event=show,
+        )
+    except ValueError as e:
+        log(f"✖ {e}")
+        return 1
+
+    for path in paths:
+        log(f"✓ 已儲存: {path}")
+    if stats["passes"]:
+        log(f"  音訊 {stats['audio_seconds']:.1f} 秒 | {stats['segments']} 段 | "
+            f"推論 {stats['passes']} 次，平均 {stats['mean_pass_seconds']:.2f} 秒，最長 {stats['max_pass_seconds']:.2f} 秒")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
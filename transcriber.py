@@ -1,14 +1,15 @@
 import customtkinter as ctk
 import threading
 import os
-import time
 from tkinter import filedialog, messagebox
-from faster_whisper import WhisperModel
-from opencc import OpenCC
-from datetime import timedelta
-import re
-import platform
+from client import DEFAULT_SERVER_URL, JobClient, JobServerError
+from engine import TranscriptionEngine
+from ui_channel import UIChannel
 # --- 設定 ---
+# 批次中斷（取消或程式關閉）後重新執行時，從上次的位置繼續
+GUI_JOB_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "gui-job")
+UI_REFRESH_MS = 100      # 每 100ms 更新一次畫面（進度最多每秒 10 次）
+LOG_MAX_LINES = 2000     # 日誌區最多保留的行數，超過時移除最舊的行
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
@@ -23,16 +24,29 @@ class TranscriberApp(ctk.CTk):
         # 變數
         self.file_paths = []  # 改為陣列以支援批次處理
         self.is_running = False
-        self.cancel_flag = False  # 取消標記
-        self.current_file_index = 0
-        self.start_time = None
-        
-        # 初始化繁簡轉換器
-        self.cc = OpenCC('s2twp')
-        self.model = None  # 保存模型以便重用
+        self.remote_cancel = threading.Event()  # 伺服器模式的取消要求
+
+        # 背景執行緒只透過這個通道更新畫面
+        self.ui = UIChannel()
+
+        # 轉錄引擎（模型與繁簡轉換器都在引擎內，整個批次共用）
+        self.engine = TranscriptionEngine(
+            log=self.ui.log,
+            on_status=self.ui.status,
+            on_progress=self.ui.progress,
+            job_dir=GUI_JOB_DIR,
+        )
 
         # 建立 UI
         self.create_widgets()
+        self.after(UI_REFRESH_MS, self.poll_ui)
+
+        # 視窗先顯示，再於背景偵測裝置並載入預設模型（faster-whisper 也在此時才匯入）
+        self.after(UI_REFRESH_MS, self.prewarm_model)
+
+    def prewarm_model(self):
+        """在背景執行緒預先載入目前選擇的模型，不阻塞畫面"""
+        threading.Thread(target=self.engine.prewarm, daemon=True).start()
 
     def create_widgets(self):
         # 標題
@@ -75,11 +89,20 @@ class TranscriberApp(ctk.CTk):
         
         self.model_size = ctk.CTkOptionMenu(
             self.settings_frame, 
-            values=["base (快)", "small (平衡)", "medium (推薦)", "large-v3 (最準/慢)"]
+            values=["base (快)", "small (平衡)", "medium (推薦)", "large-v3 (最準/慢)"],
+            command=self.on_model_selected
         )
         self.model_size.set("medium (推薦)") 
         self.model_size.pack(side="left", padx=10)
 
+        # 略過靜音 (VAD)
+        self.vad_checkbox = ctk.CTkCheckBox(self.settings_frame, text="略過靜音 (VAD)")
+        self.vad_checkbox.pack(side="left", padx=15)
+
+        # 送到本機工作伺服器 (server.py) 排隊，而不是在這台電腦上轉錄
+        self.server_checkbox = ctk.CTkCheckBox(self.settings_frame, text="送到轉錄伺服器")
+        self.server_checkbox.pack(side="left", padx=5)
+
         # 按鈕區域
         self.button_frame = ctk.CTkFrame(self)
         self.button_frame.pack(pady=10, padx=20, fill="x")
@@ -157,8 +180,32 @@ class TranscriberApp(ctk.CTk):
                 self.log(f"  • {os.path.basename(path)}")
 
     def log(self, message):
-        """輸出日誌訊息"""
-        self.log_box.insert("end", message + "\n")
+        """輸出日誌訊息（任何執行緒皆可呼叫）"""
+        self.ui.log(message)
+
+    def poll_ui(self):
+        """主迴圈定時取出背景執行緒的更新並一次繪製"""
+        update = self.ui.drain()
+        if update["dropped"]:
+            update["logs"].insert(0, f"... (略過 {update['dropped']} 行日誌)")
+        if update["logs"]:
+            self.append_logs(update["logs"])
+        if update["status"] is not None:
+            self.update_status(update["status"])
+        if update["progress"] is not None:
+            self.progressbar.set(update["progress"])
+        if update["time_text"] is not None:
+            self.update_time_label(update["time_text"])
+        for func, args in update["calls"]:
+            func(*args)
+        self.after(UI_REFRESH_MS, self.poll_ui)
+
+    def append_logs(self, lines):
+        """批次寫入日誌區，並只保留最後 LOG_MAX_LINES 行"""
+        self.log_box.insert("end", "\n".join(lines) + "\n")
+        line_count = int(self.log_box.index("end-1c").split(".")[0])
+        if line_count > LOG_MAX_LINES:
+            self.log_box.delete("1.0", f"{line_count - LOG_MAX_LINES + 1}.0")
         self.log_box.see("end")
 
     def update_status(self, text):
@@ -169,9 +216,16 @@ class TranscriberApp(ctk.CTk):
         """更新時間標籤"""
         self.time_label.configure(text=text)
 
+    def on_model_selected(self, selection):
+        """切換模型時先在背景載入，按下開始時不必等待"""
+        if not self.is_running:
+            self.engine.model_name = selection.split(" ")[0]
+            self.prewarm_model()
+
     def cancel_transcription(self):
         """取消轉錄"""
-        self.cancel_flag = True
+        self.engine.cancel()
+        self.remote_cancel.set()
         self.update_status("正在取消...")
         self.log("⚠ 使用者要求取消操作")
 
@@ -185,293 +239,105 @@ class TranscriberApp(ctk.CTk):
             return
 
         self.is_running = True
-        self.cancel_flag = False
         self.run_btn.configure(state="disabled", text="處理中...")
         self.cancel_btn.configure(state="normal")
         self.progressbar.set(0)
         self.update_time_label("")
         
+        # Tk 元件只能在主執行緒讀取：先取得選項再交給背景執行緒
+        # 每次都依選單決定模型；載入過的模型仍常駐，切換回來不必重新載入
+        model_name = self.model_size.get().split(" ")[0]
+        vad_filter = bool(self.vad_checkbox.get())
+        use_server = bool(self.server_checkbox.get())
+
         # 啟動背景執行緒
-        thread = threading.Thread(target=self.process_audio, daemon=True)
+        thread = threading.Thread(target=self.process_audio, args=(model_name, vad_filter, use_server), daemon=True)
         thread.start()
 
-    def get_device_config(self):
-        """根據作業系統自動選擇最佳裝置設定"""
-        system = platform.system()
-        machine = platform.machine()
-        
-        if system == "Darwin":  # macOS
-            if machine == "arm64":  # Apple Silicon (M1/M2/M3/M4)
-                self.log("✓ 偵測到 Apple Silicon，使用 Metal GPU 加速")
-                return {
-                    "device": "cpu",  # faster-whisper 在 macOS 上使用 "cpu" 但會利用 Metal
-                    "compute_type": "int8",
-                    "cpu_threads": 8,
-                    "num_workers": 4
-                }
-            else:  # Intel Mac
-                self.log("✓ 偵測到 Intel Mac，使用 CPU 運算")
-                return {
-                    "device": "cpu",
-                    "compute_type": "int8"
-                }
-        
-        # elif system == "Windows":  # Windows
-        #     try:
-        #         import torch
-        #         if torch.cuda.is_available():
-        #             self.log("✓ 偵測到 NVIDIA GPU，使用 CUDA 加速")
-        #             return {
-        #                 "device": "cuda",
-        #                 "compute_type": "float16"
-        #             }
-        #         else:
-        #             self.log("✓ 未偵測到 GPU，使用 CPU 運算")
-        #             return {
-        #                 "device": "cpu",
-        #                 "compute_type": "int8"
-        #             }
-        #     except ImportError:
-        #         self.log("⚠ 未安裝 PyTorch，使用 CPU 運算")
-        #         return {
-        #             "device": "cpu",
-        #             "compute_type": "int8"
-        #         }
-        
-        # else:  # Linux 或其他系統
-        #     try:
-        #         import torch
-        #         if torch.cuda.is_available():
-        #             self.log("✓ 偵測到 NVIDIA GPU，使用 CUDA 加速")
-        #             return {
-        #                 "device": "cuda",
-        #                 "compute_type": "float16"
-        #             }
-        #         else:
-        #             self.log("✓ 使用 CPU 運算")
-        #             return {
-        #                 "device": "cpu",
-        #                 "compute_type": "int8"
-        #             }
-        #     except ImportError:
-        #         self.log("✓ 使用 CPU 運算")
-        #         return {
-        #             "device": "cpu",
-        #             "compute_type": "int8"
-        #         }
-            
-    def process_audio(self):
+    def process_audio(self, model_name, vad_filter, use_server):
         """處理音訊（支援批次）"""
         try:
-            # 載入模型（只載入一次）- 針對 Apple Silicon 優化
-            if self.model is None:
-                selection = self.model_size.get()
-                model_name = selection.split(" ")[0]
-                
-                self.update_status(f"正在載入 Whisper 模型: {model_name}...")
-                self.log(f"\n正在載入模型 {model_name} (初次執行需下載模型，請稍候)...")
-                self.progressbar.set(0.05)
-                
-                # 取得最佳裝置設定
-                device_config = self.get_device_config()
-
-                self.model = WhisperModel(model_name, **device_config)
-                
-                self.log("✓ 模型載入完成")
-            
-            # 批次處理所有檔案
-            total_files = len(self.file_paths)
-            successful = 0
-            
-            for idx, file_path in enumerate(self.file_paths):
-                if self.cancel_flag:
-                    self.log("\n✖ 批次處理已取消")
-                    break
-                
-                self.current_file_index = idx
-                self.log(f"\n{'='*60}")
-                self.log(f"處理檔案 {idx+1}/{total_files}: {os.path.basename(file_path)}")
-                self.log(f"{'='*60}")
-                
-                # 處理單一檔案
-                if self.process_single_file(file_path, total_files, idx):
-                    successful += 1
-            
+            self.engine.model_name = model_name
+            self.engine.vad_filter = vad_filter
+
+            if use_server:
+                self.process_remote()
+                return
+
+            result = self.engine.process_batch(self.file_paths)
+
             # 最終結果
-            if not self.cancel_flag:
-                self.progressbar.set(1.0)
-                self.update_status("全部完成！")
-                self.update_time_label("")
-                self.log(f"\n{'='*60}")
-                self.log(f"✓ 批次處理完成！成功: {successful}/{total_files}")
-                self.log(f"{'='*60}")
-                
-                messagebox.showinfo(
+            if not result["cancelled"]:
+                # 整批完成後清除續跑狀態，下次選同樣的檔案會重新轉錄
+                self.engine.job.clear()
+                self.ui.call(
+                    messagebox.showinfo,
                     "完成", 
-                    f"批次處理完成！\n\n成功處理: {successful} 個檔案\n總共: {total_files} 個檔案"
+                    f"批次處理完成！\n\n成功處理: {result['successful']} 個檔案\n總共: {result['total']} 個檔案"
                 )
 
         except Exception as e:
             self.log(f"\n✖ 錯誤: {str(e)}")
-            messagebox.showerror("發生錯誤", f"執行過程中發生錯誤:\n{str(e)}")
+            self.ui.call(messagebox.showerror, "發生錯誤", f"執行過程中發生錯誤:\n{str(e)}")
         
         finally:
-            self.is_running = False
-            self.cancel_flag = False
-            self.run_btn.configure(state="normal", text="開始轉錄")
-            self.cancel_btn.configure(state="disabled")
-            self.update_time_label("")
-
-    def process_single_file(self, file_path, total_files, file_idx):
-        """處理單一檔案"""
+            self.ui.call(self.on_batch_finished)
+
+    def process_remote(self):
+        """把檔案送到工作伺服器，輪詢進度直到全部完成（背景執行緒）"""
+        client = JobClient(DEFAULT_SERVER_URL)
+        self.remote_cancel.clear()
+        total = len(self.file_paths)
+        successful = 0
         try:
-            # 檢查檔案是否存在
-            if not os.path.exists(file_path):
-                self.log(f"✖ 檔案不存在: {file_path}")
-                return False
-            
-            self.start_time = time.time()
-            
-            self.update_status(f"轉錄中 ({file_idx+1}/{total_files}): {os.path.basename(file_path)}")
-            
-            # 執行轉錄
-            segments, info = self.model.transcribe(
-                file_path, 
-                beam_size=5, 
-                language="zh",
-                initial_prompt="這是一段繁體中文的對話，請使用台灣地區的用詞。每個句子盡量保持簡短*最多只能有18個字，請在適當的地方斷句*，適合字幕顯示。"
-            )
-            
-            transcribed_text = ""
-            srt_content = ""
-            segment_id = 1
-            total_duration = info.duration if info.duration > 0 else 1
-
-            # 處理每個片段
-            for segment in segments:
-                # 檢查取消
-                if self.cancel_flag:
-                    self.log("✖ 處理已取消")
-                    return False
-                
-                # 計算總進度（考慮批次）
-                batch_base_progress = file_idx / total_files
-                file_progress = (segment.end / total_duration) / total_files
-                total_progress = batch_base_progress + file_progress
-                
-                # 限制在 0-1 之間
-                total_progress = max(0.05, min(0.95, total_progress))
-                self.progressbar.set(total_progress)
-                
-                # 計算預估時間
-                elapsed_time = time.time() - self.start_time
-                progress_ratio = segment.end / total_duration
-                
-                if progress_ratio > 0.05:  # 至少處理 5% 再估算
-                    estimated_file_time = elapsed_time / progress_ratio
-                    remaining_file_time = estimated_file_time - elapsed_time
-                    
-                    # 估算整個批次的剩餘時間
-                    avg_time_per_file = elapsed_time / (progress_ratio)
-                    remaining_files = total_files - file_idx - 1
-                    total_remaining = remaining_file_time + (remaining_files * avg_time_per_file)
-                    
-                    elapsed_str = str(timedelta(seconds=int(elapsed_time)))
-                    remaining_str = str(timedelta(seconds=int(total_remaining)))
-                    
-                    time_text = f"已用: {elapsed_str} | 預估剩餘: {remaining_str}"
-                    self.after(0, self.update_time_label, time_text)
-
-                # 繁簡轉換
-                original_text = segment.text
-                traditional_text = self.cc.convert(original_text)
-                
-                # 轉換為全形標點符號
-                punctuation_map = {
-                    ',': '，', '.': '。', '!': '！', '?': '？',
-                    ';': '；', ':': '：', '(': '（', ')': '）',
-                    '[': '「', ']': '」', '{': '『', '}': '』',
-                    '"': '」', "'": '」', '-': '－', '~': '～',
-                }
-                for half, full in punctuation_map.items():
-                    traditional_text = traditional_text.replace(half, full)
-
-                # 格式化時間
-                start_time = self.format_time(segment.start)
-                end_time = self.format_time(segment.end)
-                
-               # 在逗號和頓號處斷句
-                text_lines = []
-                current_text = traditional_text.strip()
-                
-                # 先按逗號和頓號分割
-                parts = re.split(r'([，？。])', current_text)
-                temp_line = ""
-                
-                for part in parts:
-                    if not part:
-                        continue
-                    
-                    # 如果是標點符號，加到當前行後斷行
-                    if part in '，？。':
-                        if temp_line:
-                            text_lines.append(temp_line.strip())
-                            temp_line = ""
-                    else:
-                        # 累積文字
-                        temp_line += part
-                
-                # 處理剩餘文字
-                if temp_line.strip():
-                    text_lines.append(temp_line.strip())
-                
-                # 如果沒有分割結果，使用原文
-                if not text_lines:
-                    text_lines = [current_text]
-                
-                # TXT 格式：保持單行但移除句尾標點
-                clean_text = traditional_text.strip().rstrip('，。！？、；：,.!?;:')
-                transcribed_text += f"[{start_time}] {clean_text}\n"
-                
-                # SRT 格式：使用分行後的結果
-                srt_text = '\n'.join(text_lines).strip().rstrip('，。！？、；：,.!?;:')
-                srt_content += f"{segment_id}\n{start_time} --> {end_time}\n{srt_text}\n\n"
-                
-                # 輸出到日誌（顯示所有內容）
-                if len(text_lines) > 1:
-                    self.log(f"[{start_time}] (共{len(text_lines)}行)")
-                    for idx, line in enumerate(text_lines, 1):
-                        self.log(f"  第{idx}行: {line}")
+            job_ids = [
+                client.submit(path, model=self.engine.model_name, vad=self.engine.vad_filter)
+                for path in self.file_paths
+            ]
+        except (OSError, JobServerError) as e:
+            raise RuntimeError(f"無法連線到轉錄伺服器 {DEFAULT_SERVER_URL}: {e}")
+        self.log(f"✓ 已送出 {total} 個工作到 {DEFAULT_SERVER_URL}")
+
+        for idx, (path, job_id) in enumerate(zip(self.file_paths, job_ids)):
+            name = os.path.basename(path)
+
+            def on_update(status, idx=idx, name=name):
+                if status["state"] == "queued":
+                    self.ui.status(f"{name}: 排隊中 (前面還有 {status.get('queue_position', 0)} 個)")
                 else:
-                    self.log(f"[{start_time}] {text_lines[0] if text_lines else clean_text}")
-                segment_id += 1
-
-            # 儲存檔案
-            base_name = os.path.splitext(file_path)[0]
-            srt_filename = f"{base_name}_cht.srt"
-            txt_filename = f"{base_name}_cht.txt"
-            
-            with open(srt_filename, "w", encoding="utf-8") as f:
-                f.write(srt_content)
-            
-            with open(txt_filename, "w", encoding="utf-8") as f:
-                f.write(transcribed_text)
-
-            self.log(f"✓ 字幕檔已儲存: {os.path.basename(srt_filename)}")
-            self.log(f"✓ 純文字檔已儲存: {os.path.basename(txt_filename)}")
-            
-            return True
+                    self.ui.status(f"{name}: {status['state']}")
+                self.ui.progress((idx + status.get("progress", 0.0)) / total)
+
+            status = client.wait(job_id, on_update=on_update, should_cancel=self.remote_cancel.is_set)
+            if status["state"] == "done":
+                successful += 1
+                for output in status["outputs"].values():
+                    self.log(f"✓ 已儲存: {os.path.basename(output)}")
+            else:
+                self.log(f"✖ {name}: {status['state']} {status.get('error') or ''}")
+            if self.remote_cancel.is_set():
+                for remaining in job_ids[idx + 1:]:
+                    try:
+                        client.cancel(remaining)
+                    except JobServerError:
+                        pass
+                self.log("\n✖ 批次處理已取消")
+                return
+
+        self.ui.progress(1.0, "")
+        self.ui.status("全部完成！")
+        self.ui.call(
+            messagebox.showinfo,
+            "完成",
+            f"批次處理完成！\n\n成功處理: {successful} 個檔案\n總共: {total} 個檔案"
+        )
 
-        except Exception as e:
-            self.log(f"✖ 處理失敗: {str(e)}")
-            return False
-
-    def format_time(self, seconds):
-        """將秒數轉為 SRT 時間格式 (HH:MM:SS,mmm)"""
-        m, s = divmod(seconds, 60)
-        h, m = divmod(m, 60)
-        ms = int((s - int(s)) * 1000)
-        return f"{int(h):02}:{int(m):02}:{int(s):02},{ms:03}"
+    def on_batch_finished(self):
+        """批次結束後恢復按鈕狀態（主執行緒）"""
+        self.is_running = False
+        self.run_btn.configure(state="normal", text="開始轉錄")
+        self.cancel_btn.configure(state="disabled")
+        self.update_time_label("")
 
 if __name__ == "__main__":
     app = TranscriberApp()
@@ -45,7 +45,8 @@ exe = EXE(
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    # 不以 UPX 壓縮：壓縮過的函式庫每次啟動都要先解壓縮（macOS 上也會破壞簽章）
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -60,7 +61,7 @@ coll = COLLECT(
     a.zipfiles,
     a.datas,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     name='中文轉錄工具',
 )
@@ -0,0 +1,65 @@
+"""背景執行緒 -> Tk 主迴圈的事件通道
+
+背景執行緒只把事件放進佇列（O(1)，不碰任何 Tk 元件），主迴圈以固定間隔取出：
+進度與狀態只保留最新值，日誌超過上限時丟棄最舊的行，轉錄速度不受 GUI 繪製速度影響。
+"""
+import threading
+from collections import deque
+
+
+class UIChannel:
+    """執行緒安全的 UI 更新佇列"""
+
+    def __init__(self, max_pending_logs=1000):
+        self._lock = threading.Lock()
+        self._logs = deque(maxlen=max_pending_logs)
+        self._dropped = 0
+        self._status = None
+        self._progress = None
+        self._time_text = None
+        self._calls = deque()
+
+    # --- 背景執行緒呼叫 ---
+
+    def log(self, message):
+        """加入一行日誌"""
+        with self._lock:
+            if len(self._logs) == self._logs.maxlen:
+                self._dropped += 1
+            self._logs.append(message)
+
+    def status(self, text):
+        """更新狀態文字（只保留最新值）"""
+        with self._lock:
+            self._status = text
+
+    def progress(self, value, time_text=None):
+        """更新進度（只保留最新值）"""
+        with self._lock:
+            self._progress = value
+            if time_text is not None:
+                self._time_text = time_text
+
+    def call(self, func, *args):
+        """在主執行緒執行 func（例如 messagebox、按鈕狀態）"""
+        with self._lock:
+            self._calls.append((func, args))
+
+    # --- 主執行緒呼叫 ---
+
+    def drain(self):
+        """取出目前累積的所有更新"""
+        with self._lock:
+            update = {
+                "logs": list(self._logs),
+                "dropped": self._dropped,
+                "status": self._status,
+                "progress": self._progress,
+                "time_text": self._time_text,
+                "calls": list(self._calls),
+            }
+            self._logs.clear()
+            self._calls.clear()
+            self._dropped = 0
+            self._status = self._progress = self._time_text = None
+        return update
@@ -0,0 +1,311 @@
+"""資料夾監看：錄音檔寫入完成後自動轉錄，字幕輸出在音訊檔旁
+
+有安裝 watchdog 時以檔案系統事件（Linux 為 inotify）得知新檔案，否則定期掃描資料夾。
+檔案大小與修改時間持續 settle_seconds 秒不變才視為寫入完成；已處理的檔案記錄在索引中，
+重新啟動後不會重做。
+
+用法:
+    python watcher.py 錄音資料夾/ --model medium
+    python watcher.py 錄音資料夾/ 另一個資料夾/ --recursive --settle 30
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import tempfile
+import threading
+
+from audio_store import DEFAULT_MAX_BYTES as AUDIO_STORE_MAX_BYTES, DEFAULT_STORE_DIR as AUDIO_STORE_DIR
+from engine import SUPPORTED_EXTENSIONS, TranscriptionEngine, collect_audio_files
+from models import ModelRegistry
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser("~"), ".cache", "mp3-transcriber", "watch_index.json")
+DEFAULT_SETTLE_SECONDS = 10.0
+DEFAULT_POLL_INTERVAL = 5.0
+# 有檔案系統事件時仍定期完整掃描一次（事件佇列溢位、網路磁碟不一定會送出事件）
+DEFAULT_RESCAN_INTERVAL = 600.0
+TICK_SECONDS = 1.0
+
+
+def _stat_key(path):
+    """(大小, 修改時間 ns)；檔案不存在時回傳 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def is_watched_file(path):
+    """支援的音訊格式，略過隱藏檔（錄音軟體寫入中的暫存檔多以 . 開頭）"""
+    name = os.path.basename(path)
+    return not name.startswith(".") and name.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+class ProcessedIndex:
+    """已處理檔案的索引：{絕對路徑: [大小, 修改時間 ns, 是否成功]}
+
+    檔案被修改（大小或修改時間改變）後視為新檔案重新處理；失敗的檔案在修改前不再重試。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.entries = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f).get("files", {})
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"files": self.entries}, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def is_processed(self, path, key=None):
+        key = key or _stat_key(path)
+        entry = self.entries.get(os.path.abspath(path))
+        return key is not None and entry is not None and tuple(entry[:2]) == key
+
+    def mark(self, path, success, key=None):
+        key = key or _stat_key(path)
+        if key is not None:
+            self.entries[os.path.abspath(path)] = [key[0], key[1], bool(success)]
+
+    def prune(self):
+        """移除已不存在的檔案，回傳移除數量"""
+        missing = [path for path in self.entries if not os.path.exists(path)]
+        for path in missing:
+            del self.entries[path]
+        return len(missing)
+
+
+class FolderWatcher:
+    """監看資料夾，把寫入完成的新錄音交給同一個常駐模型的引擎轉錄"""
+
+    def __init__(self, directories, engine, index=None, recursive=False,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL,
+                 rescan_interval=DEFAULT_RESCAN_INTERVAL, use_events=True, log=print):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.engine = engine
+        self.index = index or ProcessedIndex()
+        self.recursive = recursive
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.rescan_interval = rescan_interval
+        self.use_events = use_events and Observer is not None
+        self.log = log
+
+        self.pending = {}  # 路徑 -> ((大小, 修改時間), 開始不變的時間)
+        self._lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.cancel_event = None  # 目前批次的取消旗標
+        self._observer = None
+
+    def observe(self, path):
+        """記錄檔案目前的狀態；狀態改變時重新開始計算穩定時間"""
+        if not is_watched_file(path):
+            return
+        path = os.path.abspath(path)
+        key = _stat_key(path)
+        with self._lock:
+            if key is None or self.index.is_processed(path, key):
+                self.pending.pop(path, None)
+                return
+            previous = self.pending.get(path)
+            if previous is None or previous[0] != key:
+                self.pending[path] = (key, time.monotonic())
+
+    def scan(self):
+        for path in collect_audio_files(self.directories, recursive=self.recursive):
+            self.observe(path)
+
+    def ready(self):
+        """大小持續 settle_seconds 秒不變（且不為空）的檔案，依路徑排序"""
+        with self._lock:
+            paths = list(self.pending)
+        for path in paths:
+            self.observe(path)  # 重新取得大小，寫入中的檔案會重設計時
+        now = time.monotonic()
+        with self._lock:
+            return sorted(
+                path for path, (key, since) in self.pending.items()
+                if key[0] > 0 and now - since >= self.settle_seconds
+            )
+
+    def process(self, paths):
+        """轉錄一批檔案並更新索引；回傳成功數"""
+        keys = {path: _stat_key(path) for path in paths}
+        self.cancel_event = threading.Event()
+        try:
+            result = self.engine.process_batch(paths, self.cancel_event)
+        except Exception as e:
+            # 例如模型載入失敗：檔案留在等待清單，下一輪重試，監看不中斷
+            self.log(f"✖ 批次處理失敗: {e}")
+            with self._lock:
+                for path in paths:
+                    if path in self.pending:
+                        self.pending[path] = (self.pending[path][0], time.monotonic())
+            return 0
+        for entry in result["files"]:
+            path = entry["file"]
+            if not entry["success"] and self.cancel_event.is_set():
+                continue  # 停止時中斷的檔案下次啟動再處理
+            if _stat_key(path) == keys[path]:  # 轉錄期間又被修改時保留在等待清單
+                with self._lock:
+                    self.index.mark(path, entry["success"], keys[path])
+                    self.pending.pop(path, None)
+        self.index.save()
+        return result["successful"]
+
+    def _start_observer(self):
+        handler = _EventHandler(self.observe)
+        observer = Observer()
+        for directory in self.directories:
+            observer.schedule(handler, directory, recursive=self.recursive)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def run(self):
+        """執行到 stop() 為止"""
+        for directory in self.directories:
+            if not os.path.isdir(directory):
+                raise NotADirectoryError(directory)
+
+        if self.use_events:
+            self._observer = self._start_observer()
+            mode = "檔案系統事件"
+        else:
+            mode = f"每 {self.poll_interval:g} 秒掃描"
+        self.log(f"✓ 開始監看 {len(self.directories)} 個資料夾（{mode}，檔案 {self.settle_seconds:g} 秒未變動才轉錄）")
+        for directory in self.directories:
+            self.log(f"  {directory}")
+
+        removed = self.index.prune()
+        if removed:
+            self.index.save()
+
+        rescan_interval = self.rescan_interval if self._observer else self.poll_interval
+        last_scan = None
+        try:
+            while not self.stop_event.is_set():
+                if last_scan is None or time.monotonic() - last_scan >= rescan_interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+                paths = self.ready()
+                if paths:
+                    self.log(f"\n↻ 偵測到 {len(paths)} 個新檔案")
+                    self.process(paths)
+                    continue
+                self.stop_event.wait(TICK_SECONDS)
+        finally:
+            if self._observer:
+                self._observer.stop()
+                self._observer.join()
+                self._observer = None
+
+    def stop(self):
+        self.stop_event.set()
+        if self.cancel_event:
+            self.cancel_event.set()
+
+
+if Observer is not None:
+    class _EventHandler(FileSystemEventHandler):
+        """新增、修改、移入的檔案交給 observe（寫入完成與否由 ready 判斷）"""
+
+        def __init__(self, callback):
+            super().__init__()
+            self.callback = callback
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self.callback(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self.callback(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.callback(event.dest_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="監看資料夾並自動轉錄新錄音")
+    parser.add_argument("directories", nargs="+", help="要監看的資料夾")
+    parser.add_argument("-m", "--model", default="medium", help="Whisper 模型 (預設: medium)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="包含子資料夾")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help=f"檔案持續幾秒未變動才視為寫入完成 (預設: {DEFAULT_SETTLE_SECONDS:g})")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"未安裝 watchdog 時的掃描間隔秒數 (預設: {DEFAULT_POLL_INTERVAL:g})")
+    parser.add_argument("--polling", action="store_true", help="不使用檔案系統事件，一律定期掃描（適用網路磁碟）")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="已處理檔案索引的路徑")
+    parser.add_argument("--vad", action="store_true", help="轉錄前以 VAD 略過靜音與非語音段落")
+    parser.add_argument("--job-dir", default=None, help="續跑狀態資料夾：中斷的檔案下次從最後記錄的片段繼續")
+    parser.add_argument("--audio-store", action="store_true", help="解碼後的音訊保存為 memmap 檔，重跑時不重複解碼")
+    parser.add_argument("--audio-store-dir", default=AUDIO_STORE_DIR, help="音訊儲存區資料夾")
+    parser.add_argument("--audio-store-max-mb", type=int, default=AUDIO_STORE_MAX_BYTES // (1024 * 1024), help="音訊儲存區容量上限 (MB)")
+    parser.add_argument("--model-memory-mb", type=int, default=None, help="常駐模型的記憶體預算 (MB)")
+    parser.add_argument("--metrics-log", default=None, help="每個檔案的分段計時以 JSON 行附加到此檔案")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不輸出每個片段的內容")
+    args = parser.parse_args(argv)
+
+    def log(message):
+        if args.quiet and message.startswith(("[", "  第")):
+            return
+        print(message, flush=True)
+
+    memory_budget = args.model_memory_mb * 1024 * 1024 if args.model_memory_mb else None
+    engine = TranscriptionEngine(
+        model_name=args.model,
+        log=log,
+        vad_filter=args.vad,
+        job_dir=args.job_dir,
+        audio_store_dir=args.audio_store_dir if args.audio_store else None,
+        audio_store_max_bytes=args.audio_store_max_mb * 1024 * 1024,
+        metrics_log=args.metrics_log,
+        models=ModelRegistry(memory_budget, log=log),
+    )
+    engine.prewarm()  # 等待第一個檔案時先載入模型
+
+    watcher = FolderWatcher(
+        args.directories,
+        engine,
+        index=ProcessedIndex(args.index),
+        recursive=args.recursive,
+        settle_seconds=args.settle,
+        poll_interval=args.poll_interval,
+        use_events=not args.polling,
+        log=log,
+    )
+    signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop())  # systemd 等停止服務時收尾後結束
+    try:
+        watcher.run()
+    except NotADirectoryError as e:
+        print(f"✖ 找不到資料夾: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        watcher.stop()
+        print("\n✖ 停止監看", file=sys.stderr)
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,304 @@
+"""串流輸出：每個片段完成就寫入暫存檔，整個檔案完成後再以原子操作改名為正式檔名
+
+所有格式共用同一份後處理結果 (SubtitleEntry)，繁簡轉換與標點只做一次；
+輸出多種格式時每種格式由各自的執行緒格式化並寫入。
+"""
+import os
+import json
+import queue
+import threading
+from collections import namedtuple
+
+from srt_io import SrtBlock, SrtStreamWriter, ms_to_timestamp, seconds_to_ms
+
+# 後處理完成的字幕片段：lines 為斷行後的字幕行，text 為單行純文字，
+# words 為逐字時間 (chunking.Word，文字已轉為繁體)；未啟用 word_timestamps 時為空
+SubtitleEntry = namedtuple("SubtitleEntry", ["index", "start", "end", "lines", "text", "words"], defaults=((),))
+
+# 每種格式的寫入佇列上限：寫檔較慢時轉錄端等待，不無限制累積
+WRITER_QUEUE_SIZE = 64
+
+
+def format_time(seconds):
+    """將秒數轉為 SRT 時間格式 (HH:MM:SS,mmm)"""
+    return ms_to_timestamp(seconds_to_ms(seconds))
+
+
+def format_vtt_time(seconds):
+    """WebVTT 時間格式 (HH:MM:SS.mmm)"""
+    return format_time(seconds).replace(",", ".")
+
+
+def format_ass_time(seconds):
+    """ASS 時間格式 (H:MM:SS.cc)"""
+    cs = seconds_to_ms(seconds) // 10
+    s, cs = divmod(cs, 100)
+    m, s = divmod(s, 60)
+    h, m = divmod(m, 60)
+    return f"{h}:{m:02}:{s:02}.{cs:02}"
+
+
+def assign_words(words, blocks):
+    """把片段的逐字時間分配給 retime 拆出的各個區塊（依每個字的中點時間）"""
+    if len(blocks) == 1:
+        return [tuple(words)]
+    groups = [[] for _ in blocks]
+    idx = 0
+    for word in words:
+        middle = (word.start + word.end) / 2
+        while idx < len(blocks) - 1 and middle >= blocks[idx][1]:
+            idx += 1
+        groups[idx].append(word)
+    return [tuple(group) for group in groups]
+
+
+class SubtitleWriter:
+    """輸出格式的共同介面：子類別設定 suffix 並實作 write_entry"""
+
+    suffix = ""
+
+    def __init__(self, source_path):
+        base_name = os.path.splitext(source_path)[0]
+        self.path = f"{base_name}{self.suffix}"
+        # 轉錄中可直接開啟 .part 檔查看目前的進度
+        self.temp_path = f"{self.path}.part"
+        self.file = open(self.temp_path, "w", encoding="utf-8")
+        self.write_header()
+
+    def write_header(self):
+        """檔頭（預設無）"""
+
+    def write_footer(self):
+        """檔尾（預設無）"""
+
+    def write_entry(self, entry):
+        raise NotImplementedError
+
+    def write(self, entry):
+        """寫入一個片段並立即 flush"""
+        self.write_entry(entry)
+        self.file.flush()
+
+    def commit(self):
+        """完成：關閉檔案並改名為正式檔名"""
+        self.write_footer()
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        """取消或失敗：刪除暫存檔"""
+        self.file.close()
+        try:
+            os.remove(self.temp_path)
+        except OSError:
+            pass
+
+
+class SrtWriter(SubtitleWriter):
+    suffix = "_cht.srt"
+
+    def __init__(self, source_path):
+        super().__init__(source_path)
+        self.srt = SrtStreamWriter(self.file, trailing_blank_line=True)
+
+    def write_entry(self, entry):
+        self.srt.write(SrtBlock(
+            entry.index,
+            seconds_to_ms(entry.start),
+            seconds_to_ms(entry.end),
+            tuple(entry.lines),
+        ))
+
+
+class TxtWriter(SubtitleWriter):
+    suffix = "_cht.txt"
+
+    def write_entry(self, entry):
+        self.file.write(f"[{format_time(entry.start)}] {entry.text}\n")
+
+
+class VttWriter(SubtitleWriter):
+    """WebVTT：網頁播放器 (<track>) 使用"""
+
+    suffix = "_cht.vtt"
+
+    def write_header(self):
+        self.file.write("WEBVTT\n\n")
+
+    def write_entry(self, entry):
+        text = "\n".join(entry.lines).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        self.file.write(f"{entry.index}\n{format_vtt_time(entry.start)} --> {format_vtt_time(entry.end)}\n{text}\n\n")
+
+
+class JsonWriter(SubtitleWriter):
+    """JSON：每個片段一行，含字幕行與逐字時間（需啟用 word_timestamps），供搜尋索引使用"""
+
+    suffix = "_cht.json"
+
+    def __init__(self, source_path):
+        self.source_path = source_path
+        self.count = 0
+        super().__init__(source_path)
+
+    def write_header(self):
+        source = json.dumps(os.path.basename(self.source_path), ensure_ascii=False)
+        self.file.write(f'{{"source": {source}, "segments": [\n')
+
+    def write_footer(self):
+        self.file.write("\n]}\n")
+
+    def write_entry(self, entry):
+        data = {
+            "index": entry.index,
+            "start": round(entry.start, 3),
+            "end": round(entry.end, 3),
+            "text": entry.text,
+            "lines": list(entry.lines),
+        }
+        if entry.words:
+            data["words"] = [
+                {"start": round(w.start, 3), "end": round(w.end, 3), "word": w.word.strip(),
+                 "probability": round(w.probability, 3)}
+                for w in entry.words
+            ]
+        if self.count:
+            self.file.write(",\n")
+        self.file.write(json.dumps(data, ensure_ascii=False))
+        self.count += 1
+
+
+class AssWriter(SubtitleWriter):
+    """ASS (Advanced SubStation Alpha)：影片剪輯軟體與播放器可套用字型樣式"""
+
+    suffix = "_cht.ass"
+
+    HEADER = (
+        "[Script Info]\n"
+        "ScriptType: v4.00+\n"
+        "PlayResX: 1920\n"
+        "PlayResY: 1080\n"
+        "WrapStyle: 2\n"  # 已斷行，播放器不再自動換行
+        "ScaledBorderAndShadow: yes\n"
+        "\n"
+        "[V4+ Styles]\n"
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, "
+        "Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, "
+        "Alignment, MarginL, MarginR, MarginV, Encoding\n"
+        "Style: Default,Noto Sans TC,64,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,"
+        "0,0,0,0,100,100,0,0,1,3,1,2,40,40,50,1\n"
+        "\n"
+        "[Events]\n"
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n"
+    )
+
+    def write_header(self):
+        self.file.write(self.HEADER)
+
+    def write_entry(self, entry):
+        # 大括號在 ASS 中是樣式標籤，改為全形
+        text = "\\N".join(line.replace("{", "｛").replace("}", "｝") for line in entry.lines)
+        self.file.write(f"Dialogue: 0,{format_ass_time(entry.start)},{format_ass_time(entry.end)},Default,,0,0,0,,{text}\n")
+
+
+# 可用的輸出格式；新增格式只需實作 SubtitleWriter 並在此註冊
+WRITERS = {
+    "srt": SrtWriter,
+    "txt": TxtWriter,
+    "vtt": VttWriter,
+    "json": JsonWriter,
+    "ass": AssWriter,
+}
+
+DEFAULT_FORMATS = ("srt", "txt")
+
+_STOP = object()
+
+
+class _WriterThread:
+    """單一格式的背景寫入執行緒；寫入失敗時在下一次 put 或 close 重新拋出"""
+
+    def __init__(self, writer, maxsize=WRITER_QUEUE_SIZE):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name=f"writer{writer.suffix}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            entry = self.queue.get()
+            if entry is _STOP:
+                return
+            if self.error is None:
+                try:
+                    self.writer.write(entry)
+                except BaseException as e:
+                    self.error = e
+
+    def put(self, entry):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(entry)
+
+    def close(self):
+        """等待佇列寫完"""
+        self.queue.put(_STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class OutputSet:
+    """同時輸出多種格式：只有一種格式時直接寫入，多種格式時各自在背景執行緒寫入"""
+
+    def __init__(self, source_path, formats=DEFAULT_FORMATS):
+        self.writers = []
+        self.threads = []
+        try:
+            for name in formats:
+                self.writers.append(WRITERS[name](source_path))
+        except BaseException:
+            self.abort()
+            raise
+        if len(self.writers) > 1:
+            self.threads = [_WriterThread(writer) for writer in self.writers]
+
+    def write(self, entry):
+        if self.threads:
+            for thread in self.threads:
+                thread.put(entry)
+        else:
+            for writer in self.writers:
+                writer.write(entry)
+
+    def _join(self):
+        threads, self.threads = self.threads, []
+        error = None
+        for thread in threads:
+            try:
+                thread.close()
+            except BaseException as e:
+                error = error or e
+        if error is not None:
+            raise error
+
+    def commit(self):
+        try:
+            self._join()
+            for writer in self.writers:
+                writer.commit()
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        try:
+            self._join()
+        except BaseException:
+            pass  # 已經要刪除暫存檔，寫入錯誤不必再回報
+        for writer in self.writers:
+            writer.abort()
+
+    @property
+    def paths(self):
+        return [writer.path for writer in self.writers]